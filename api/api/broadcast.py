@@ -0,0 +1,238 @@
+"""
+A per-process broadcast hub for pushing events to open streams (see
+users.stream).
+
+Streams subscribe to topics such as `user:42` or `video:7` and receive
+every message published to any of them:
+
+    from api.broadcast import publish
+    publish(['video:7'], {'event': 'likes', 'video_id': 7, 'likes_count': 12})
+
+Like api.tasks, a message is handed to the backend once the current
+transaction commits, so subscribers never hear about rows they cannot
+read yet. The backend is picked by the BROADCAST setting:
+
+* 'memory' delivers within the process. Tests and single-process
+  deployments want this.
+* 'postgres' sends messages with NOTIFY on OPTIONS['channel'], so every
+  worker process receives them. Each process runs one listener thread,
+  started by the first subscription. It holds its own connection, which
+  is outside the pool and waits in LISTEN. Messages published while the
+  listener reconnects are lost; streams must be able to catch up on
+  their own.
+
+A message names all its topics, so a fan-out to many users is a single
+NOTIFY per TOPICS_PER_MESSAGE topics (NOTIFY payloads are limited to
+8000 bytes). Messages must be small JSON objects: a stream that needs
+more fetches it itself.
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.backends.postgresql.psycopg_any import is_psycopg3
+
+logger = logging.getLogger(__name__)
+
+TOPICS_PER_MESSAGE = 200
+MAX_PENDING = 100
+
+
+class Subscription:
+    """
+    A stream's view of the hub: an asyncio queue bound to the event loop
+    it was created on. A subscriber that falls MAX_PENDING messages behind
+    is marked `overflowed` and gets nothing more; it should close and let
+    the client reconnect.
+    """
+
+    def __init__(self, hub, topics, loop):
+        self.hub = hub
+        self.topics = frozenset(topics)
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=MAX_PENDING)
+        self.overflowed = False
+
+    async def get(self):
+        return await self.queue.get()
+
+    def _put(self, data):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(data)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class Hub:
+    """Routes published messages to the subscriptions of this process."""
+
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, topics):
+        """Must be called from the event loop that will read the subscription."""
+        subscription = Subscription(self, topics, asyncio.get_running_loop())
+        with self._lock:
+            for topic in subscription.topics:
+                self._subscriptions[topic].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for topic in subscription.topics:
+                subscribers = self._subscriptions.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscriptions[topic]
+
+    def dispatch(self, topics, data):
+        """Delivers a message; safe to call from any thread."""
+        with self._lock:
+            targets = set()
+            for topic in topics:
+                targets.update(self._subscriptions.get(topic, ()))
+        for subscription in targets:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._put, data)
+            except RuntimeError:
+                # The subscriber's loop is closed; it is going away anyway
+                pass
+
+    def __len__(self):
+        with self._lock:
+            return len({s for subscribers in self._subscriptions.values() for s in subscribers})
+
+
+class MemoryBackend:
+    def __init__(self, hub, **options):
+        self.hub = hub
+
+    def start(self):
+        pass
+
+    def publish(self, topics, data):
+        self.hub.dispatch(topics, data)
+
+
+class PostgresBackend:
+    def __init__(self, hub, channel='broadcast', alias='default', timeout=5.0, reconnect_delay=1.0):
+        self.hub = hub
+        self.channel = channel
+        self.alias = alias
+        self.timeout = timeout
+        self.reconnect_delay = reconnect_delay
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._listen_forever, name='broadcast-listener', daemon=True)
+                self._thread.start()
+
+    def publish(self, topics, data):
+        payload = json.dumps({'t': list(topics), 'd': data}, separators=(',', ':'))
+        with connections[self.alias].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.channel, payload])
+
+    def _receive(self, payload):
+        try:
+            message = json.loads(payload)
+            self.hub.dispatch(message['t'], message['d'])
+        except (ValueError, KeyError, TypeError):
+            logger.warning('Ignoring malformed broadcast message %r', payload[:200])
+
+    def _listen_forever(self):
+        while True:
+            try:
+                if is_psycopg3:
+                    self._listen_psycopg3()
+                else:
+                    self._listen_psycopg2()
+            except Exception:
+                logger.warning('Broadcast listener lost its connection, reconnecting', exc_info=True)
+            time.sleep(self.reconnect_delay)
+
+    def _connection_params(self):
+        return connections[self.alias].get_connection_params()
+
+    def _listen_psycopg3(self):
+        import psycopg
+        with psycopg.connect(**self._connection_params(), autocommit=True) as conn:
+            conn.execute(f'LISTEN "{self.channel}"')
+            while True:
+                for notify in conn.notifies(timeout=self.timeout):
+                    self._receive(notify.payload)
+
+    def _listen_psycopg2(self):
+        import psycopg2
+        conn = psycopg2.connect(**self._connection_params())
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute(f'LISTEN "{self.channel}"')
+            while True:
+                if select.select([conn], [], [], self.timeout) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    self._receive(conn.notifies.pop(0).payload)
+        finally:
+            conn.close()
+
+
+BACKENDS = {
+    'memory': MemoryBackend,
+    'postgres': PostgresBackend,
+}
+
+hub = Hub()
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                config = getattr(settings, 'BROADCAST', {})
+                backend_class = BACKENDS[config.get('BACKEND', 'memory')]
+                _backend = backend_class(hub, **config.get('OPTIONS', {}))
+    return _backend
+
+
+def publish(topics, data):
+    """Sends `data` to the subscribers of any of `topics` once the current transaction commits."""
+    topics = list(topics)
+
+    def send():
+        backend = get_backend()
+        for start in range(0, len(topics), TOPICS_PER_MESSAGE):
+            try:
+                backend.publish(topics[start:start + TOPICS_PER_MESSAGE], data)
+            except Exception:
+                # Pushes are best effort; the write that caused them stands
+                logger.exception('Could not publish to %s', topics[start])
+
+    if topics:
+        transaction.on_commit(send)
+
+
+def subscribe(topics):
+    """A new Subscription to `topics` for the running event loop."""
+    get_backend().start()
+    return hub.subscribe(topics)
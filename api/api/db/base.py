@@ -0,0 +1,54 @@
+"""
+PostgreSQL backend that measures how long it takes to get a connection.
+
+It is Django's own backend with `get_new_connection` timed. With the
+psycopg pool enabled (DB_POOL) that is the time spent waiting for a
+pooled connection; otherwise it is the time to open a new one. Reused
+persistent connections cost nothing and are not reported.
+
+Each measurement is passed to the callable named by the
+DB_CONNECTION_METRICS_HOOK setting as `hook(alias, seconds, pooled)`.
+The default hook logs acquisitions slower than
+DB_SLOW_CONNECTION_SECONDS as warnings on the `api.db` logger. Point the
+setting at your own function to export the numbers to a metrics system.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.db.backends.postgresql.base import DatabaseWrapper as PostgreSQLDatabaseWrapper
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger('api.db')
+
+SLOW_CONNECTION_SECONDS = getattr(settings, 'DB_SLOW_CONNECTION_SECONDS', 0.1)
+
+_hook = None
+
+
+def log_connection(alias, seconds, pooled):
+    """The default metrics hook."""
+    source = 'from the pool' if pooled else 'new connection'
+    if seconds >= SLOW_CONNECTION_SECONDS:
+        logger.warning('Database %s: waited %.1f ms for a connection (%s)', alias, seconds * 1000, source)
+    else:
+        logger.debug('Database %s: got a connection in %.1f ms (%s)', alias, seconds * 1000, source)
+
+
+def get_metrics_hook():
+    global _hook
+    if _hook is None:
+        _hook = import_string(getattr(settings, 'DB_CONNECTION_METRICS_HOOK', 'api.db.base.log_connection'))
+    return _hook
+
+
+class DatabaseWrapper(PostgreSQLDatabaseWrapper):
+    def get_new_connection(self, conn_params):
+        started = time.perf_counter()
+        connection = super().get_new_connection(conn_params)
+        try:
+            get_metrics_hook()(self.alias, time.perf_counter() - started, self.pool is not None)
+        except Exception:
+            # Metrics must never take the database down with them
+            logger.exception('Database connection metrics hook failed')
+        return connection
@@ -30,6 +30,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework_simplejwt',
     'operations',
@@ -69,19 +70,64 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'api.wsgi.application'
 
+# Database connections. Under uvicorn (ASGI) a persistent connection is
+# tied to the thread that served the request, so the psycopg 3 pool
+# (DB_POOL=True) is the way to serve many requests from a small, fixed
+# number of connections: each worker process holds between
+# DB_POOL_MIN_SIZE and DB_POOL_MAX_SIZE of them. Without the pool,
+# connections are kept for DB_CONN_MAX_AGE seconds. Either way they are
+# health-checked before reuse. api.db times connection acquisition, see
+# api/db/base.py.
+DB_POOL = os.getenv('DB_POOL', 'False') == 'True'
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'api.db',
         'NAME': os.getenv('DB_NAME'),
         'USER': os.getenv('DB_USER'),
         'PASSWORD': os.getenv('DB_PASSWORD'),
         'HOST': os.getenv('DB_HOST', 'localhost'),
         'PORT': os.getenv('DB_PORT', '5432'),
-        'CONN_MAX_AGE': 0,  # Close connections after 60 seconds
-      
+        # The pool replaces persistent connections; Django rejects both at once.
+        'CONN_MAX_AGE': 0 if DB_POOL else int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'pool': {
+                'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+                'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+                'timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+                'max_idle': float(os.getenv('DB_POOL_MAX_IDLE', 300)),
+            },
+        } if DB_POOL else {},
     }
 }
 
+# The shared cache. Unread notification counts (users/unread.py), mute
+# sets (users/mutes.py), avatar checks (users/avatars.py) and scraped
+# metadata (videos/cache.py) are written by one uvicorn worker and read
+# by all of them, so production must point REDIS_URL at a Redis server.
+# Without it every process gets its own local memory cache, which is only
+# correct with a single worker (e.g. runserver).
+REDIS_URL = os.getenv('REDIS_URL', '')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'myvidvault',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Called with (alias, seconds, pooled) for every connection acquired, see api/db/base.py
+DB_CONNECTION_METRICS_HOOK = os.getenv('DB_CONNECTION_METRICS_HOOK', 'api.db.base.log_connection')
+DB_SLOW_CONNECTION_SECONDS = float(os.getenv('DB_SLOW_CONNECTION_SECONDS', 0.1))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -116,6 +162,31 @@ SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(days=1),
 }
 
+# Scraped URL metadata cache, see videos/cache.py
+SCRAPER_CACHE = {
+    'BACKEND': 'videos.cache.DjangoMetadataCache',
+    'OPTIONS': {'alias': 'default'},
+    'TIMEOUT': 60 * 60 * 24,
+    'FAILURE_TIMEOUT': 60 * 5,
+}
+
+# Title tag suggestions, see videos/tagging.py
+TAG_GENERATOR_MODE = os.getenv('TAG_GENERATOR_MODE', 'nltk')
+TAG_GENERATOR_WARM_UP = os.getenv('TAG_GENERATOR_WARM_UP', 'False') == 'True'
+
+# Background tasks, see api/tasks.py
+TASKS = {
+    'BACKEND': os.getenv('TASKS_BACKEND', 'thread'),
+    'OPTIONS': {'workers': int(os.getenv('TASKS_WORKERS', 4))},
+}
+
+# Pushes to open event streams, see api/broadcast.py. 'postgres' reaches
+# every uvicorn worker; 'memory' only the publishing process.
+BROADCAST = {
+    'BACKEND': os.getenv('BROADCAST_BACKEND', 'postgres'),
+    'OPTIONS': {'channel': os.getenv('BROADCAST_CHANNEL', 'myvidvault_events')},
+}
+
 CORS_ALLOW_CREDENTIALS = True
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",
@@ -0,0 +1,79 @@
+"""
+A minimal background task runner for work that should not hold up a
+request, such as bookmark imports.
+
+    from api.tasks import enqueue
+    enqueue(run_import_job, job.pk)
+
+The task is handed to the backend once the current transaction commits,
+so it always sees the rows the request wrote. The backend is picked by
+the TASKS setting:
+
+* 'thread' runs tasks on a pool of OPTIONS['workers'] threads in the web
+  process. Tasks are lost if the process exits, so anything enqueued
+  must record its own progress and be safe to re-run.
+* 'immediate' runs tasks inline, which is what tests and management
+  commands want. It ignores the options.
+
+Tasks receive plain arguments (ids, not model instances) so that a
+queue backed by an external broker can be swapped in later.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+
+def _run(func, args, kwargs):
+    close_old_connections()
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception('Background task %s failed', getattr(func, '__qualname__', func))
+    finally:
+        close_old_connections()
+
+
+class ImmediateBackend:
+    def __init__(self, **options):
+        pass
+
+    def submit(self, func, *args, **kwargs):
+        func(*args, **kwargs)
+
+
+class ThreadBackend:
+    def __init__(self, workers=4):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='tasks')
+
+    def submit(self, func, *args, **kwargs):
+        self.executor.submit(_run, func, args, kwargs)
+
+
+BACKENDS = {
+    'immediate': ImmediateBackend,
+    'thread': ThreadBackend,
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                config = getattr(settings, 'TASKS', {})
+                backend_class = BACKENDS[config.get('BACKEND', 'thread')]
+                _backend = backend_class(**config.get('OPTIONS', {}))
+    return _backend
+
+
+def enqueue(func, *args, **kwargs):
+    """Runs `func(*args, **kwargs)` in the background after the current transaction commits."""
+    transaction.on_commit(lambda: get_backend().submit(func, *args, **kwargs))
@@ -9,8 +9,15 @@ from users.views import (
     CollectionChannelsListView,
     BookmarkCreateAPIView,
     MyProfileView,ToggleFollowView,
+    MyCollectionsTreeView,
+    ChannelBookmarksListView,
+    NotificationListView,
+    NotificationMarkReadView,
+    UnreadNotificationCountView,
+    EventStreamView,
+    EventStreamTokenView,
 )
-from videos.views import ManualBookmarkCreateView, VideoLikeToggleView,UsersWhoBookmarkedView, VideoLikeStatusView, URLMetadataScraperView
+from videos.views import ManualBookmarkCreateView, VideoLikeToggleView,UsersWhoBookmarkedView, VideoLikeStatusView, URLMetadataScraperView, VideoViewerStateView, BookmarkImportView, BookmarkImportJobView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -25,17 +32,28 @@ urlpatterns = [
     path('api/bookmarks/<int:id>/', BookmarkDetailAPIView.as_view(), name='bookmark-detail'),
     path('api/bookmarks/create/', BookmarkCreateAPIView.as_view(), name='bookmark-create'),
     path('api/bookmarks/manual-create/', ManualBookmarkCreateView.as_view(), name='manual-bookmark-create'),
+    path('api/bookmarks/import/', BookmarkImportView.as_view(), name='bookmark-import'),
+    path('api/bookmarks/import/<int:pk>/', BookmarkImportJobView.as_view(), name='bookmark-import-job'),
     path('api/scrape-metadata/', URLMetadataScraperView.as_view(), name='scrape-metadata'),
 
     path('api/collections/', MyCollectionsListView.as_view(), name='my-collections'),
+    path('api/collections/tree/', MyCollectionsTreeView.as_view(), name='my-collections-tree'),
+    path('api/channels/<int:channel_id>/bookmarks/', ChannelBookmarksListView.as_view(), name='channel-bookmarks'),
     path('api/collections/<int:collection_id>/channels/', CollectionChannelsListView.as_view(), name='collection-channels'),
 
     path('api/profile/<str:username>/', UserProfileView.as_view(), name='user-profile'),
 
     # New URL for liking/unliking videos
     path('api/videos/<int:video_id>/like/', VideoLikeToggleView.as_view(), name='video-like-toggle'),
+    path('api/videos/viewer-state/', VideoViewerStateView.as_view(), name='video-viewer-state'),
     path('api/videos/<int:video_id>/like-status/', VideoLikeStatusView.as_view(), name='video-like-status'),
     path('api/videos/<int:video_id>/users-bookmarked/', UsersWhoBookmarkedView.as_view(), name='users-who-bookmarked'),
     path('api/users/<int:user_id>/toggle-follow/', ToggleFollowView.as_view(), name='toggle-follow'),
 
+    path('api/notifications/', NotificationListView.as_view(), name='notification-list'),
+    path('api/notifications/mark-read/', NotificationMarkReadView.as_view(), name='notification-mark-read'),
+    path('api/notifications/unread-count/', UnreadNotificationCountView.as_view(), name='notification-unread-count'),
+    path('api/events/', EventStreamView.as_view(), name='event-stream'),
+    path('api/events/token/', EventStreamTokenView.as_view(), name='event-stream-token'),
+
 ]
@@ -0,0 +1,42 @@
+"""
+The users who bookmarked a video.
+
+A user who saved the video into several channels has several Bookmark
+rows, so users are selected with an EXISTS semi-join instead of by
+walking the bookmarks. Each user appears once, most recent bookmark
+first, with the profile joined in for UserPublicSerializer.
+
+The total is cached for BOOKMARKERS_COUNT_TIMEOUT seconds so that paging
+through a popular video does not re-run the COUNT(*) on every page.
+`operations.signals` drops the cached totals when one of the video's
+bookmarks is saved or deleted.
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef, Subquery
+
+from users.models import Bookmark
+
+BOOKMARKERS_COUNT_TIMEOUT = getattr(settings, 'BOOKMARKERS_COUNT_TIMEOUT', 60 * 5)
+
+
+def video_bookmarkers(video_id, public_only=False):
+    bookmarks = Bookmark.objects.filter(video_id=video_id, user_id=OuterRef('pk'))
+    if public_only:
+        bookmarks = bookmarks.filter(access='public')
+    newest = bookmarks.order_by('-created_at').values('created_at')[:1]
+    return (
+        User.objects.filter(Exists(bookmarks))
+        .annotate(bookmarked_at=Subquery(newest))
+        .select_related('profile')
+        .order_by('-bookmarked_at', '-pk')
+    )
+
+
+def bookmarkers_count_key(video_id, public_only=False):
+    return f"video-bookmarkers:{video_id}:{'public' if public_only else 'all'}"
+
+
+def invalidate_bookmarkers_count(video_id):
+    cache.delete_many([bookmarkers_count_key(video_id), bookmarkers_count_key(video_id, True)])
@@ -0,0 +1,116 @@
+import hashlib
+import json
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef
+from django.db.models.functions import Random
+
+from users.models import Bookmark
+from .models import Video, VideoFeedEntry
+
+# Seconds a shuffled feed's page-number total is reused, see feed_count_key
+FEED_COUNT_TIMEOUT = getattr(settings, 'FEED_COUNT_TIMEOUT', 60)
+
+# Query parameters that page through a feed without changing its rows
+PAGING_PARAMS = {'page', 'seed', 'cursor', 'pagination'}
+
+
+def refresh_feed_entries(video_ids):
+    """
+    Recomputes the feed entry of each given video from its bookmarks.
+
+    The canonical bookmark is the one with the lowest id, matching the
+    `Min('id')` rule the feed used before the projection existed. Videos
+    that no longer have any bookmarks lose their entry.
+    """
+    video_ids = set(video_ids)
+    if not video_ids:
+        return
+
+    canonical = (
+        Bookmark.objects.filter(video_id__in=video_ids)
+        .order_by('video_id', 'id')
+        .distinct('video_id')
+        .values_list('video_id', 'id', 'access', 'created_at', 'video__orientation')
+    )
+
+    tag_ids = defaultdict(list)
+    for video_id, tag_id in Video.tags.through.objects.filter(
+        video_id__in=video_ids
+    ).values_list('video_id', 'tag_id'):
+        tag_ids[video_id].append(tag_id)
+
+    entries = [
+        VideoFeedEntry(
+            video_id=video_id,
+            bookmark_id=bookmark_id,
+            access=access,
+            created_at=created_at,
+            orientation=orientation,
+            tag_ids=sorted(tag_ids[video_id]),
+        )
+        for video_id, bookmark_id, access, created_at, orientation in canonical
+    ]
+    if entries:
+        VideoFeedEntry.objects.bulk_create(
+            entries,
+            update_conflicts=True,
+            unique_fields=['video'],
+            update_fields=['bookmark', 'access', 'created_at', 'orientation', 'tag_ids'],
+        )
+
+    stale = video_ids - {entry.video_id for entry in entries}
+    if stale:
+        VideoFeedEntry.objects.filter(video_id__in=stale).delete()
+
+
+def rebuild_feed_entries(batch_size=1000):
+    """
+    Rebuilds every feed entry from scratch in batches and drops orphans.
+    Returns the number of videos processed.
+    """
+    VideoFeedEntry.objects.filter(
+        ~Exists(Bookmark.objects.filter(video_id=OuterRef('video_id')))
+    ).delete()
+
+    video_ids = (
+        Video.objects.filter(Exists(Bookmark.objects.filter(video_id=OuterRef('pk'))))
+        .order_by('pk')
+        .values_list('pk', flat=True)
+    )
+    processed = 0
+    batch = []
+    for video_id in video_ids.iterator(chunk_size=batch_size):
+        batch.append(video_id)
+        if len(batch) >= batch_size:
+            refresh_feed_entries(batch)
+            processed += len(batch)
+            batch = []
+    if batch:
+        refresh_feed_entries(batch)
+        processed += len(batch)
+    return processed
+
+
+def reshuffle_feed_entries():
+    """Assigns every feed entry a new random key, changing the shuffled order."""
+    return VideoFeedEntry.objects.update(random_key=Random())
+
+
+def seed_offset(seed):
+    """Maps a random-feed seed to a stable starting point in [0, 1)."""
+    digest = hashlib.sha256(seed.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') / 2 ** 64
+
+
+def feed_count_key(query_params, user_id):
+    """
+    Cache key of a feed's total for the given filters and viewer. Mutes
+    and follows make the total per user, so the viewer is part of the key.
+    Nothing invalidates it: it lives for FEED_COUNT_TIMEOUT seconds and the
+    count it holds is an estimate for page links, not a guarantee.
+    """
+    filters = sorted((name, values) for name, values in query_params.lists() if name not in PAGING_PARAMS)
+    digest = hashlib.sha256(json.dumps([user_id, filters]).encode('utf-8')).hexdigest()
+    return f'feed-count:{digest[:32]}'
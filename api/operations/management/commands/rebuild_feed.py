@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from operations.feed import rebuild_feed_entries, reshuffle_feed_entries
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the VideoFeedEntry projection (one canonical bookmark per video) from Bookmark."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Videos refreshed per batch.")
+        parser.add_argument(
+            '--reshuffle', action='store_true',
+            help="Also assign new random keys, changing the order of sort=random feeds.",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        processed = rebuild_feed_entries(batch_size=options['batch_size'])
+        if options['reshuffle']:
+            reshuffle_feed_entries()
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt feed entries for {processed} videos in {elapsed:.1f}s."
+        ))
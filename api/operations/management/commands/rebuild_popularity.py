@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from operations.popularity import rebuild_popularity
+
+
+class Command(BaseCommand):
+    help = "Recounts bookmarks and likes per video and recomputes the hotness score. Safe to run from cron."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help="Video primary keys per UPDATE.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        updated = rebuild_popularity(batch_size=options['batch_size'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Recomputed popularity for {updated} videos in {elapsed:.1f}s."
+        ))
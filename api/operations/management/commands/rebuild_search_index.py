@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from operations.search import rebuild_search_vectors
+
+
+class Command(BaseCommand):
+    help = "Recomputes the full-text search vector of every video."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help="Video primary keys per UPDATE.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        updated = rebuild_search_vectors(batch_size=options['batch_size'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt search vectors for {updated} videos in {elapsed:.1f}s."
+        ))
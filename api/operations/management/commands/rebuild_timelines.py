@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from operations.timeline import TIMELINE_MAX_LENGTH, rebuild_timelines, trim_timelines
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the materialized following timelines (TimelineEntry) from Follow and Bookmark."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Followers rebuilt per batch.")
+        parser.add_argument(
+            '--trim', action='store_true',
+            help=f"Only cut every timeline down to its newest {TIMELINE_MAX_LENGTH} entries.",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if options['trim']:
+            deleted = trim_timelines()
+            elapsed = time.monotonic() - started
+            self.stdout.write(self.style.SUCCESS(f"Trimmed {deleted} timeline entries in {elapsed:.1f}s."))
+            return
+        processed = rebuild_timelines(batch_size=options['batch_size'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt timelines for {processed} users in {elapsed:.1f}s."
+        ))
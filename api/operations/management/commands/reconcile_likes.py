@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from operations.likes import reconcile_likes
+
+
+class Command(BaseCommand):
+    help = "Recounts likes per video from VideoLike and repairs likes_count where it drifted."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help="Video primary keys per query.")
+        parser.add_argument('--dry-run', action='store_true', help="Only report drift; change nothing.")
+        parser.add_argument('--show', type=int, default=20, help="Drifted videos to list individually.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        drifted = reconcile_likes(batch_size=options['batch_size'], dry_run=options['dry_run'])
+        elapsed = time.monotonic() - started
+
+        for video_id, stored, actual in sorted(drifted, key=lambda row: -abs(row[1] - row[2]))[:options['show']]:
+            self.stdout.write(f"  video {video_id}: stored {stored}, actual {actual} ({actual - stored:+d})")
+        total = sum(abs(stored - actual) for _, stored, actual in drifted)
+        action = "Found" if options['dry_run'] else "Repaired"
+        self.stdout.write(self.style.SUCCESS(
+            f"{action} {len(drifted)} drifted videos (total drift {total}) in {elapsed:.1f}s."
+        ))
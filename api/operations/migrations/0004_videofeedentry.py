@@ -0,0 +1,44 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:21
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+BACKFILL_SQL = """
+INSERT INTO operations_videofeedentry (video_id, bookmark_id, orientation, access, created_at, tag_ids)
+SELECT DISTINCT ON (b.video_id)
+    b.video_id, b.id, v.orientation, b.access, b.created_at,
+    COALESCE((SELECT array_agg(vt.tag_id) FROM operations_video_tags vt WHERE vt.video_id = b.video_id), '{}')
+FROM users_bookmark b
+JOIN operations_video v ON v.id = b.video_id
+ORDER BY b.video_id, b.id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operations', '0003_video_player_type'),
+        ('users', '0003_alter_profile_default_bookmark_collection_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoFeedEntry',
+            fields=[
+                ('video', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='feed_entry', serialize=False, to='operations.video')),
+                ('orientation', models.CharField(blank=True, choices=[('straight', 'Straight'), ('gay', 'Gay'), ('bi', 'Bi'), ('trans', 'Trans'), ('sfw', 'SFW')], max_length=10, null=True)),
+                ('access', models.CharField(choices=[('private', 'Private'), ('public', 'Public'), ('adult', 'Adult')], max_length=10)),
+                ('created_at', models.DateTimeField(help_text='Creation time of the canonical bookmark')),
+                ('tag_ids', django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), blank=True, default=list, help_text="Ids of the video's tags", size=None)),
+                ('bookmark', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entry', to='users.bookmark')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['-created_at', '-bookmark'], name='vfe_crt_bm_idx'), models.Index(fields=['orientation', '-created_at', '-bookmark'], name='vfe_orient_crt_idx'), django.contrib.postgres.indexes.GinIndex(fields=['tag_ids'], name='vfe_tag_ids_gin')],
+            },
+        ),
+        migrations.RunSQL(BACKFILL_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Initial values; later drift is repaired with `manage.py rebuild_popularity`.
+BACKFILL_SQL = [
+    """
+    UPDATE operations_video v SET
+        bookmarks_count = (SELECT COUNT(*) FROM users_bookmark b WHERE b.video_id = v.id),
+        likes_count = (SELECT COUNT(*) FROM operations_videolike l WHERE l.video_id = v.id)
+    """,
+    """
+    UPDATE operations_video SET hotness =
+        LOG(10, GREATEST(1, 2 * bookmarks_count + likes_count))
+        + EXTRACT(EPOCH FROM created_at) / 86400
+    """,
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operations', '0004_videofeedentry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='bookmarks_count',
+            field=models.PositiveIntegerField(default=0, help_text='Cached count of bookmarks for this video'),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='hotness',
+            field=models.FloatField(default=0, help_text='Time-decayed popularity score, see operations.popularity'),
+        ),
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['-hotness', '-id'], name='vid_hotness_idx'),
+        ),
+        migrations.RunSQL(BACKFILL_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:24
+
+import operations.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operations', '0005_video_popularity'),
+        ('users', '0003_alter_profile_default_bookmark_collection_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videofeedentry',
+            name='random_key',
+            field=models.FloatField(default=operations.models.random_feed_key, help_text='Position in the shuffled feed, in [0, 1)'),
+        ),
+        migrations.AddIndex(
+            model_name='videofeedentry',
+            index=models.Index(fields=['random_key', 'bookmark'], name='vfe_random_idx'),
+        ),
+        # AddField evaluates the default once; give existing rows their own keys.
+        migrations.RunSQL(
+            'UPDATE operations_videofeedentry SET random_key = random()',
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:25
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+
+# Mirrors operations.search.search_vector_expression at the time of writing.
+BACKFILL_SQL = """
+UPDATE operations_video v SET search_vector =
+    setweight(to_tsvector('english', COALESCE(v.title, '')), 'A')
+    || setweight(to_tsvector('english', COALESCE((
+        SELECT string_agg(t.name, ' ') FROM operations_tag t
+        JOIN operations_video_tags vt ON vt.tag_id = t.id WHERE vt.video_id = v.id
+    ), '')), 'B')
+    || setweight(to_tsvector('english', COALESCE((
+        SELECT string_agg(b.title, ' ') FROM users_bookmark b WHERE b.video_id = v.id
+    ), '')), 'B')
+    || setweight(to_tsvector('english', COALESCE((
+        SELECT string_agg(COALESCE(b.description, ''), ' ') FROM users_bookmark b WHERE b.video_id = v.id
+    ), '')), 'C')
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operations', '0006_videofeedentry_random_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, help_text='Weighted title/tag/bookmark text, maintained by operations.search', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='video',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='vid_search_gin'),
+        ),
+        migrations.RunSQL(BACKFILL_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
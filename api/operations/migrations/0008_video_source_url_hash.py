@@ -0,0 +1,20 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:33
+
+import django.contrib.postgres.indexes
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operations', '0007_video_search_vector'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='video',
+            index=django.contrib.postgres.indexes.HashIndex(fields=['source_url'], name='vid_source_url_hash'),
+        ),
+    ]
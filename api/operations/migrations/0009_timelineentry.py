@@ -0,0 +1,45 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# The newest 200 public bookmarks of every followed account
+BACKFILL_SQL = """
+INSERT INTO operations_timelineentry (user_id, bookmark_id, author_id, created_at)
+SELECT f.follower_id, b.id, b.user_id, b.created_at
+FROM users_follow f
+CROSS JOIN LATERAL (
+    SELECT id, user_id, created_at FROM users_bookmark
+    WHERE user_id = f.followed_id AND access = 'public'
+    ORDER BY created_at DESC LIMIT 200
+) b
+ON CONFLICT DO NOTHING
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operations', '0008_video_source_url_hash'),
+        ('users', '0005_profile_avatar_processing'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(help_text='Creation time of the bookmark')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('bookmark', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='users.bookmark')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-created_at'], name='tle_user_crt_idx'), models.Index(fields=['user', 'author'], name='tle_user_author_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'bookmark'), name='tle_user_bookmark_uniq')],
+            },
+        ),
+        migrations.RunSQL(BACKFILL_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
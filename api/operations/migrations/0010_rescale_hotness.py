@@ -0,0 +1,22 @@
+from django.db import migrations
+
+# HOTNESS_TIMESCALE went from one day to one week, see operations.popularity
+RESCALE_SQL = """
+    UPDATE operations_video SET hotness =
+        LOG(10, GREATEST(1, 2 * bookmarks_count + likes_count))
+        + EXTRACT(EPOCH FROM created_at) / %s
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operations', '0009_timelineentry'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            [(RESCALE_SQL, [7 * 86400])],
+            reverse_sql=[(RESCALE_SQL, [86400])],
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:47
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operations', '0010_rescale_hotness'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='timelineentry',
+            name='tle_user_crt_idx',
+        ),
+    ]
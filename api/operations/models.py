@@ -1,6 +1,11 @@
+import random
+
 from django.db import models
 from django.conf import settings
-from users.models import Bookmark
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex, HashIndex
+from django.contrib.postgres.search import SearchVectorField
+from users.models import Bookmark, ACCESS_CHOICES
 
 # Choices
 PLAYER_CHOICES = [
@@ -24,6 +29,13 @@ REPORT_TYPE_CHOICES = [
     ('request_moderation', 'Request Moderation'),
 ]
 
+def random_feed_key():
+    return random.random()
+
+def normalize_tag_name(name):
+    """Tags are stored lowercased with spaces removed."""
+    return name.lower().replace(' ', '')
+
 # Models
 class Tag(models.Model):
     name = models.CharField(max_length=50, unique=True)
@@ -33,7 +45,7 @@ class Tag(models.Model):
 
     def save(self, *args, **kwargs):
         if self.name:
-            self.name = self.name.lower().replace(' ', '')
+            self.name = normalize_tag_name(self.name)
         super().save(*args, **kwargs)
 
 class Video(models.Model):
@@ -65,6 +77,14 @@ class Video(models.Model):
         help_text="User who originally added this video to the platform."
     )
     likes_count = models.PositiveIntegerField(default=0, help_text="Cached count of likes for this video")
+    bookmarks_count = models.PositiveIntegerField(default=0, help_text="Cached count of bookmarks for this video")
+    hotness = models.FloatField(default=0, help_text="Time-decayed popularity score, see operations.popularity")
+    search_vector = SearchVectorField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Weighted title/tag/bookmark text, maintained by operations.search"
+    )
 
     class Meta:
         ordering = ['-created_at']
@@ -72,11 +92,68 @@ class Video(models.Model):
             models.Index(fields=['created_at'], name='vid_created_idx'),
             models.Index(fields=['orientation', 'created_at'], name='vid_orient_crt_idx'),
             models.Index(fields=['likes_count'], name='vid_likes_idx'),
+            models.Index(fields=['-hotness', '-id'], name='vid_hotness_idx'),
+            GinIndex(fields=['search_vector'], name='vid_search_gin'),
+            # Hash rather than B-tree: source URLs can exceed the B-tree row size limit.
+            HashIndex(fields=['source_url'], name='vid_source_url_hash'),
         ]
 
     def __str__(self):
         return self.title
 
+class VideoFeedEntry(models.Model):
+    """
+    One row per bookmarked video, pointing at the video's earliest bookmark.
+
+    This is a denormalized projection of `Bookmark` used by the home feed so
+    it can be served by a single index range scan instead of grouping the
+    whole bookmark table per request. It is kept current by the handlers in
+    `operations.signals`; run `manage.py rebuild_feed` to repair drift.
+    """
+    video = models.OneToOneField(Video, on_delete=models.CASCADE, primary_key=True, related_name='feed_entry')
+    bookmark = models.OneToOneField(Bookmark, on_delete=models.CASCADE, related_name='feed_entry')
+    orientation = models.CharField(max_length=10, choices=ORIENTATION_CHOICES, blank=True, null=True)
+    access = models.CharField(max_length=10, choices=ACCESS_CHOICES)
+    created_at = models.DateTimeField(help_text="Creation time of the canonical bookmark")
+    tag_ids = ArrayField(models.BigIntegerField(), default=list, blank=True, help_text="Ids of the video's tags")
+    random_key = models.FloatField(default=random_feed_key, help_text="Position in the shuffled feed, in [0, 1)")
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-bookmark'], name='vfe_crt_bm_idx'),
+            models.Index(fields=['orientation', '-created_at', '-bookmark'], name='vfe_orient_crt_idx'),
+            models.Index(fields=['random_key', 'bookmark'], name='vfe_random_idx'),
+            GinIndex(fields=['tag_ids'], name='vfe_tag_ids_gin'),
+        ]
+
+    def __str__(self):
+        return f"Feed entry for video {self.video_id} (bookmark {self.bookmark_id})"
+
+class TimelineEntry(models.Model):
+    """
+    A public bookmark by someone `user` follows, pushed into `user`'s
+    following timeline when it was created (fan-out on write). Authors with
+    very many followers are read at request time instead; see
+    `operations.timeline`.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='timeline_entries')
+    bookmark = models.ForeignKey(Bookmark, on_delete=models.CASCADE, related_name='timeline_entries')
+    author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField(help_text="Creation time of the bookmark")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'bookmark'], name='tle_user_bookmark_uniq'),
+        ]
+        # The unique (user, bookmark) index also serves the timeline reads and trims
+        indexes = [
+            models.Index(fields=['user', 'author'], name='tle_user_author_idx'),
+        ]
+
+    def __str__(self):
+        return f"Bookmark {self.bookmark_id} in {self.user_id}'s timeline"
+
 class VideoLike(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='video_likes')
     video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='likes')
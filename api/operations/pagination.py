@@ -0,0 +1,348 @@
+import base64
+import binascii
+import datetime
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.paginator import Paginator
+from django.db import models
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination keyed on the queryset's own ORDER BY columns.
+
+    Each page is fetched with a `WHERE (a, b) < (x, y) ORDER BY a, b LIMIT n`
+    range condition instead of an OFFSET, and no COUNT(*) is ever run, so a
+    deep page costs the same as the first one. The ordering must end with a
+    unique column (normally `-id`) so that every position is unambiguous.
+    """
+    page_size = settings.REST_FRAMEWORK.get('PAGE_SIZE', 25)
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = remove_query_param(request.build_absolute_uri(), 'page')
+        self.ordering = self.get_ordering(queryset)
+        self.fields = [self.get_field(queryset, name) for name, _ in self.ordering]
+
+        position, reverse = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self._after(position, reverse))
+        if reverse:
+            queryset = queryset.order_by(*[
+                name if desc else f'-{name}' for name, desc in self.ordering
+            ])
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+
+        if reverse:
+            rows.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self._position(self.page[-1]), reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self._position(self.page[0]), reverse=True)
+
+    def get_ordering(self, queryset):
+        """Reads the (field, descending) pairs from the queryset's ORDER BY."""
+        ordering = []
+        for term in queryset.query.order_by:
+            if not isinstance(term, str) or term == '?':
+                raise ImproperlyConfigured(
+                    'KeysetPagination requires a queryset ordered by plain field names.'
+                )
+            ordering.append((term.lstrip('-'), term.startswith('-')))
+        if not ordering:
+            raise ImproperlyConfigured('KeysetPagination requires an ordered queryset.')
+        return ordering
+
+    def get_field(self, queryset, name):
+        """The model field (or annotation output field) behind an ORDER BY name."""
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        model = queryset.model
+        *path, last = name.split('__')
+        for part in path:
+            model = model._meta.get_field(part).related_model
+        field = model._meta.get_field(last)
+        return field.target_field if field.is_relation else field
+
+    def decode_cursor(self, request):
+        """
+        Returns the cursor's (position, reverse). Each position value is
+        converted with its field's `to_python()`, so a tampered cursor is a
+        404 rather than a database error.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            position = payload['p']
+            reverse = bool(payload.get('r'))
+            if not isinstance(position, list) or len(position) != len(self.fields) or None in position:
+                raise ValueError
+            position = [field.to_python(value) for field, value in zip(self.fields, position)]
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError, binascii.Error, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def encode_cursor(self, position, reverse):
+        payload = {'p': position}
+        if reverse:
+            payload['r'] = 1
+        encoded = base64.urlsafe_b64encode(
+            json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        ).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def _position(self, obj):
+        position = []
+        for name, _ in self.ordering:
+            value = obj
+            for attr in name.split('__'):
+                value = getattr(value, attr)
+            if isinstance(value, datetime.datetime):
+                # Keep full microsecond precision; DateTimeField lookups parse ISO strings.
+                value = value.isoformat()
+            position.append(value)
+        return position
+
+    def _after(self, position, reverse):
+        """
+        Builds the row-comparison predicate selecting everything that sorts
+        after `position` (or before it when paging backwards), expanded as
+        `a < x OR (a = x AND b < y) OR ...` so Django can express it.
+        """
+        condition = Q()
+        equal = {}
+        for (name, desc), value in zip(self.ordering, position):
+            lookup = 'lt' if desc != reverse else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+
+class SeededRandomPagination(KeysetPagination):
+    """
+    Forward-only cursor pagination over a seeded shuffle of the feed.
+
+    Every feed entry has a fixed random key in [0, 1). The seed picks a
+    starting offset on that circle and the feed is read in key order from
+    there, wrapping around once: first `key >= offset`, then `key < offset`.
+    Both halves are index range scans, so every page of every seed costs the
+    same and a given seed keeps its order from page to page.
+
+    The view must provide `random_key_field`, `random_seed` and
+    `random_offset`.
+    """
+    seed_query_param = 'seed'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.key_field = view.random_key_field
+        self.offset = view.random_offset
+        self.seed = view.random_seed
+        self.base_url = replace_query_param(
+            remove_query_param(request.build_absolute_uri(), 'page'),
+            self.seed_query_param, self.seed,
+        )
+        # Positions are (lap, key, id)
+        self.fields = [models.IntegerField(), self.get_field(queryset, self.key_field), self.get_field(queryset, 'id')]
+
+        position, _ = self.decode_cursor(request)
+        lap, key, pk = position if position is not None else (0, None, None)
+        if lap not in (0, 1):
+            raise NotFound(self.invalid_cursor_message)
+
+        queryset = queryset.order_by(self.key_field, 'id')
+        laps = [
+            Q(**{f'{self.key_field}__gte': self.offset}),
+            Q(**{f'{self.key_field}__lt': self.offset}),
+        ]
+        rows = []
+        for current in range(lap, 2):
+            page = queryset.filter(laps[current])
+            if current == lap and key is not None:
+                page = page.filter(
+                    Q(**{f'{self.key_field}__gt': key}) | Q(**{self.key_field: key, 'id__gt': pk})
+                )
+            rows += list(page[:self.page_size + 1 - len(rows)])
+            if len(rows) > self.page_size:
+                break
+
+        self.has_next = len(rows) > self.page_size
+        self.has_previous = False
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data['seed'] = self.seed
+        return response
+
+    def _position(self, obj):
+        key = obj
+        for attr in self.key_field.split('__'):
+            key = getattr(key, attr)
+        return [0 if key >= self.offset else 1, key, obj.id]
+
+
+class SeededPageNumberPagination(PageNumberPagination):
+    """
+    Page number pagination over the seeded shuffle (see
+    SeededRandomPagination). The seed is returned with each page and kept
+    in the next and previous links, so following them walks one order.
+
+    A page is read like the cursor variant reads it, as index range scans
+    on the random key: OFFSET into the `key >= offset` lap and, when that
+    runs out, on into the wrapped `key < offset` lap. Nothing is sorted on
+    the lap, and the OFFSET only reads ids. The totals the page arithmetic needs (the whole feed, and the
+    first lap once a page starts past it) are cached under the view's
+    `count_cache_key` for `count_cache_timeout` seconds, so paging does not
+    repeat the COUNT(*).
+
+    The view must provide `random_key_field`, `random_seed`,
+    `random_offset`, `count_cache_key` and `count_cache_timeout`.
+    """
+    seed_query_param = 'seed'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.seed = view.random_seed
+        self.page_size = self.get_page_size(request)
+        key_field, offset = view.random_key_field, view.random_offset
+        count_key, timeout = view.count_cache_key, view.count_cache_timeout
+
+        try:
+            self.number = int(request.query_params.get(self.page_query_param, 1))
+        except ValueError:
+            self.number = 0
+        if self.number < 1:
+            raise NotFound(self.invalid_page_message)
+
+        queryset = queryset.order_by(key_field, 'id')
+        first_lap = queryset.filter(**{f'{key_field}__gte': offset})
+        self.count = self._cached_count(queryset, count_key, timeout)
+        start = (self.number - 1) * self.page_size
+        if start >= self.count and self.number > 1:
+            raise NotFound(self.invalid_page_message)
+
+        # OFFSET walks the skipped rows, so it walks only their ids; the
+        # page's rows are then loaded by primary key.
+        ids = list(first_lap.values_list('pk', flat=True)[start:start + self.page_size])
+        if len(ids) < self.page_size:
+            # The first lap ends on this page or before it
+            if ids:
+                first_lap_count = start + len(ids)
+            else:
+                first_lap_count = self._cached_count(first_lap, f'{count_key}:{offset}', timeout)
+            skip = max(0, start - first_lap_count)
+            wrapped = queryset.filter(**{f'{key_field}__lt': offset})
+            ids += wrapped.values_list('pk', flat=True)[skip:skip + self.page_size - len(ids)]
+
+        rows = queryset.in_bulk(ids)
+        self.has_next = start + len(ids) < self.count
+        self.page = [rows[pk] for pk in ids if pk in rows]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.count,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+            'seed': self.seed,
+        })
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = replace_query_param(self.request.build_absolute_uri(), self.page_query_param, self.number + 1)
+        return self._with_seed(url)
+
+    def get_previous_link(self):
+        if self.number == 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.number == 2:
+            url = remove_query_param(url, self.page_query_param)
+        else:
+            url = replace_query_param(url, self.page_query_param, self.number - 1)
+        return self._with_seed(url)
+
+    def _with_seed(self, url):
+        return replace_query_param(url, self.seed_query_param, self.seed)
+
+    def _cached_count(self, queryset, key, timeout):
+        count = cache.get(key)
+        if count is None:
+            count = queryset.count()
+            cache.set(key, count, timeout)
+        return count
+
+
+class CachedCountPaginator(Paginator):
+    """A Paginator that keeps `count` in the cache under `count_key`."""
+
+    def __init__(self, *args, count_key, count_timeout, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.count_key = count_key
+        self.count_timeout = count_timeout
+
+    @cached_property
+    def count(self):
+        count = cache.get(self.count_key)
+        if count is None:
+            count = super().count
+            cache.set(self.count_key, count, self.count_timeout)
+        return count
+
+
+class CachedCountPagination(PageNumberPagination):
+    """
+    Page number pagination whose total is cached, so only the first page
+    request runs the COUNT(*).
+
+    The view must provide `count_cache_key` and `count_cache_timeout`, and
+    is responsible for deleting the key when the total changes.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        key, timeout = view.count_cache_key, view.count_cache_timeout
+        self.django_paginator_class = lambda *args, **kwargs: CachedCountPaginator(
+            *args, count_key=key, count_timeout=timeout, **kwargs
+        )
+        return super().paginate_queryset(queryset, request, view)
@@ -0,0 +1,116 @@
+"""
+Full-text search over videos.
+
+Every `Video` keeps a weighted `search_vector`:
+
+    A  video title
+    B  video tag names and the titles of its bookmarks
+    C  descriptions of its bookmarks
+
+The vector is refreshed from `operations.signals` whenever the video, its
+tags or its bookmarks change, and `manage.py rebuild_search_index`
+recomputes it for every video. Searches match whole words and word
+prefixes ("cat" finds "cats" and "category") and use the GIN index on
+`search_vector`. Text the tsquery cannot express (punctuation, or only
+stopwords such as "the who") falls back to the substring match the feed
+used before, see `substring_filter`.
+"""
+import re
+
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import Exists, F, FloatField, OuterRef, Q, Subquery, TextField, Value
+from django.db.models.functions import Cast, Coalesce
+
+from users.models import Bookmark
+from .models import Tag, Video
+
+SEARCH_CONFIG = 'english'
+
+_TERM_RE = re.compile(r'[^\W_]+')
+
+
+def _aggregated_text(queryset, field):
+    """Subquery concatenating `field` over the rows of `queryset` for the outer video."""
+    return Coalesce(
+        Subquery(queryset.annotate(text=StringAgg(field, ' ')).values('text')),
+        Value(''),
+        output_field=TextField(),
+    )
+
+
+def search_vector_expression():
+    """Returns the expression computing a video's search vector inside an UPDATE."""
+    tags = Tag.objects.filter(videos=OuterRef('pk')).order_by().values('videos')
+    bookmarks = Bookmark.objects.filter(video_id=OuterRef('pk')).order_by().values('video_id')
+    return (
+        SearchVector('title', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(_aggregated_text(tags, 'name'), weight='B', config=SEARCH_CONFIG)
+        + SearchVector(_aggregated_text(bookmarks, 'title'), weight='B', config=SEARCH_CONFIG)
+        + SearchVector(
+            _aggregated_text(bookmarks, Coalesce('description', Value(''))),
+            weight='C',
+            config=SEARCH_CONFIG,
+        )
+    )
+
+
+def refresh_search_vectors(video_ids):
+    """Recomputes the search vector of the given videos in one UPDATE."""
+    video_ids = set(video_ids)
+    if not video_ids:
+        return 0
+    return Video.objects.filter(pk__in=video_ids).update(search_vector=search_vector_expression())
+
+
+def rebuild_search_vectors(batch_size=2000):
+    """Recomputes every video's search vector, one primary key range at a time."""
+    updated = 0
+    last_pk = Video.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+    for start in range(0, last_pk + 1, batch_size):
+        updated += Video.objects.filter(pk__gte=start, pk__lt=start + batch_size).update(
+            search_vector=search_vector_expression()
+        )
+    return updated
+
+
+def build_search_query(text):
+    """
+    Turns free text into a prefix-matching tsquery (`term:* & term:*`).
+    Returns None when the text contains no searchable words: none at all,
+    or only stopwords, which the text search configuration drops.
+    """
+    terms = _TERM_RE.findall(text.lower())
+    if not terms:
+        return None
+    raw = ' & '.join(f'{term}:*' for term in terms)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT numnode(to_tsquery(%s::regconfig, %s))', [SEARCH_CONFIG, raw])
+        if not cursor.fetchone()[0]:
+            return None
+    return SearchQuery(raw, search_type='raw', config=SEARCH_CONFIG)
+
+
+def substring_filter(text):
+    """
+    Case-insensitive substring match of bookmark titles and descriptions,
+    video titles and tag names, for text `build_search_query` rejects.
+    It cannot use the search index, but such searches are rare.
+    """
+    tags = Tag.objects.filter(videos=OuterRef('video_id'), name__icontains=text)
+    return (
+        Q(title__icontains=text)
+        | Q(description__icontains=text)
+        | Q(video__title__icontains=text)
+        | Exists(tags)
+    )
+
+
+def search_rank(query, vector_field='video__search_vector'):
+    """
+    Relevance of `vector_field` for `query`, for use in annotate(). ts_rank
+    returns a float4; it is widened to double precision so the value
+    round-trips exactly through keyset cursors.
+    """
+    return Cast(SearchRank(F(vector_field), query), FloatField())
@@ -2,8 +2,11 @@ from django.contrib.auth import get_user_model
 from rest_framework import serializers
 from users.models import Bookmark
 from operations.models import Video  # adjust import if needed
-from django.core.files.storage import default_storage
-from django.conf import settings
+from operations.viewer_state import viewer_state
+from users.avatars import avatar_url
+
+# Lists show small avatars; the 128px variant covers 2x displays
+LIST_AVATAR_SIZE = 128
 
 User = get_user_model()
 
@@ -16,15 +19,7 @@ class UserPublicSerializer(serializers.ModelSerializer):
         fields = ['username', 'avatar_url', 'bio']
 
     def get_avatar_url(self, obj):
-        profile = getattr(obj, 'profile', None)
-        if profile and getattr(profile, 'avatar', None):
-            avatar_url = profile.avatar.url
-            # Check if file exists
-            avatar_path = profile.avatar.name
-            if default_storage.exists(avatar_path):
-                return avatar_url
-        # Return your default image URL
-        return settings.MEDIA_URL + 'default.jpg'
+        return avatar_url(getattr(obj, 'profile', None), size=LIST_AVATAR_SIZE)
 
     def get_bio(self, obj):
         profile = getattr(obj, 'profile', None)
@@ -62,14 +57,16 @@ class HomePageBookmarkSerializer(serializers.ModelSerializer):
             'tags',
         ]
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Present when the list view was asked for ?include=viewer_state
+        if hasattr(instance, 'viewer_is_liked'):
+            data['video_id'] = instance.video_id
+            data['viewer_state'] = viewer_state(instance)
+        return data
+
     def get_user_avatar_url(self, obj):
-        profile = getattr(obj.user, 'profile', None)
-        if profile and getattr(profile, 'avatar', None):
-            avatar_url = profile.avatar.url
-            avatar_path = profile.avatar.name
-            if default_storage.exists(avatar_path):
-                return avatar_url
-        return settings.MEDIA_URL + 'default.jpg'
+        return avatar_url(getattr(obj.user, 'profile', None), size=LIST_AVATAR_SIZE)
 
 class VideoDetailSerializer(serializers.ModelSerializer):
     class Meta:
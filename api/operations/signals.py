@@ -0,0 +1,94 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from api.tasks import enqueue
+from users.models import Bookmark, Follow
+from .models import Tag, Video, VideoFeedEntry
+from .bookmarkers import invalidate_bookmarkers_count
+from .feed import refresh_feed_entries
+from .popularity import bump_popularity
+from .search import refresh_search_vectors
+from .tags import forget_tag
+from .timeline import backfill_timeline, fan_out_bookmark, prune_timeline, remove_bookmark
+
+
+def _refresh_on_commit(video_ids):
+    video_ids = list(video_ids)
+
+    def refresh():
+        refresh_feed_entries(video_ids)
+        refresh_search_vectors(video_ids)
+
+    transaction.on_commit(refresh)
+
+def _invalidate_bookmarkers_on_commit(video_id):
+    transaction.on_commit(lambda: invalidate_bookmarkers_count(video_id))
+
+@receiver(post_save, sender=Bookmark)
+def bookmark_saved(sender, instance, created, **kwargs):
+    if created:
+        bump_popularity(instance.video_id, bookmarks=1)
+    _refresh_on_commit([instance.video_id])
+    # An edit can change the bookmark's access, so any save moves the public count
+    _invalidate_bookmarkers_on_commit(instance.video_id)
+    # Entries of a deleted bookmark go with it (on_delete=CASCADE)
+    if instance.access == 'public':
+        enqueue(fan_out_bookmark, instance.pk)
+    elif not created:
+        bookmark_id = instance.pk
+        transaction.on_commit(lambda: remove_bookmark(bookmark_id))
+
+@receiver(post_delete, sender=Bookmark)
+def bookmark_deleted(sender, instance, **kwargs):
+    bump_popularity(instance.video_id, bookmarks=-1)
+    _refresh_on_commit([instance.video_id])
+    _invalidate_bookmarkers_on_commit(instance.video_id)
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        enqueue(backfill_timeline, instance.follower_id, instance.followed_id)
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    prune_timeline(instance.follower_id, instance.followed_id)
+
+@receiver(post_save, sender=Video)
+def video_saved(sender, instance, created, **kwargs):
+    if not created:
+        VideoFeedEntry.objects.filter(video_id=instance.pk).update(orientation=instance.orientation)
+    video_id = instance.pk
+    transaction.on_commit(lambda: refresh_search_vectors([video_id]))
+
+@receiver(post_save, sender=Tag)
+def tag_saved(sender, instance, created, **kwargs):
+    if not created:
+        tag_id, name = instance.pk, instance.name
+        forget_tag(tag_id, name)
+        # Again once committed, in case a worker re-cached the old row meanwhile
+        transaction.on_commit(lambda: forget_tag(tag_id, name))
+        video_ids = list(instance.videos.values_list('pk', flat=True))
+        transaction.on_commit(lambda: refresh_search_vectors(video_ids))
+
+@receiver(post_delete, sender=Tag)
+def tag_deleted(sender, instance, **kwargs):
+    tag_id, name = instance.pk, instance.name
+    forget_tag(tag_id, name)
+    transaction.on_commit(lambda: forget_tag(tag_id, name))
+
+@receiver(m2m_changed, sender=Video.tags.through)
+def video_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        # The change came from the Tag side (tag.videos.add/remove/clear).
+        if action == 'pre_clear':
+            instance._cleared_video_ids = list(instance.videos.values_list('pk', flat=True))
+            return
+        if action == 'post_clear':
+            video_ids = getattr(instance, '_cleared_video_ids', [])
+        else:
+            video_ids = pk_set or []
+    else:
+        video_ids = [instance.pk]
+
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        _refresh_on_commit(video_ids)
@@ -0,0 +1,82 @@
+"""
+Turning user-supplied tag names into Tag ids.
+
+Names are normalized the way `Tag.save` stores them. Known names are
+answered from the shared cache (one `get_many`); the rest are looked up
+with one `IN` query, and those still missing are inserted with one
+`INSERT ... ON CONFLICT DO NOTHING` followed by a re-read, which also
+picks up tags created concurrently by another request. A bookmark's tags
+therefore cost at most three queries however many there are, and none
+for hot tags.
+
+Each cached name -> id entry has a reverse id -> name entry, so that
+renaming or deleting a tag (see operations.signals) can drop its name
+for every worker. This relies on the shared Redis cache (REDIS_URL, see
+api/settings.py). Entries also expire after TAG_CACHE_TIMEOUT seconds.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Tag, normalize_tag_name
+
+TAG_CACHE_TIMEOUT = getattr(settings, 'TAG_CACHE_TIMEOUT', 60 * 5)
+
+
+def tag_id_key(name):
+    # Tag names may contain characters that are not safe in cache keys
+    return f"tag-id:{hashlib.md5(name.encode('utf-8')).hexdigest()}"
+
+
+def tag_name_key(tag_id):
+    return f"tag-name:{tag_id}"
+
+
+def _cached_ids(names):
+    keys = {tag_id_key(name): name for name in names}
+    return {keys[key]: tag_id for key, tag_id in cache.get_many(keys).items()}
+
+
+def _remember(found):
+    entries = {}
+    for name, tag_id in found.items():
+        entries[tag_id_key(name)] = tag_id
+        entries[tag_name_key(tag_id)] = name
+    cache.set_many(entries, TAG_CACHE_TIMEOUT)
+
+
+def forget_tag(tag_id, name=None):
+    """Drops a tag's cached entries; `name` is its current name, if known."""
+    keys = [tag_name_key(tag_id)]
+    for cached_name in {cache.get(keys[0]), name} - {None}:
+        keys.append(tag_id_key(cached_name))
+    cache.delete_many(keys)
+
+
+def normalize_tag_names(names):
+    """Normalized names in input order, without duplicates or blanks."""
+    return list(dict.fromkeys(filter(None, (normalize_tag_name(name) for name in names))))
+
+
+def resolve_tags(names):
+    """Returns {normalized name: tag id} for `names`, creating missing tags."""
+    names = normalize_tag_names(names)
+    resolved = _cached_ids(names)
+    missing = [name for name in names if name not in resolved]
+    if missing:
+        found = dict(Tag.objects.filter(name__in=missing).values_list('name', 'id'))
+        new = [name for name in missing if name not in found]
+        if new:
+            Tag.objects.bulk_create([Tag(name=name) for name in new], ignore_conflicts=True)
+            found.update(Tag.objects.filter(name__in=new).values_list('name', 'id'))
+        _remember(found)
+        resolved.update(found)
+    return resolved
+
+
+def tag_ids(names, resolved=None):
+    """Tag ids for `names` in input order, for `obj.tags.set(...)`."""
+    if resolved is None:
+        resolved = resolve_tags(names)
+    return [resolved[name] for name in normalize_tag_names(names)]
@@ -0,0 +1,255 @@
+"""
+The materialized "following" timeline.
+
+Every public bookmark is pushed into the TimelineEntry rows of its
+author's followers when it is created (fan-out on write, run as a
+background task, see api.tasks). The following feed then reads the
+viewer's own entries newest bookmark first, a backward range of the
+unique (user, bookmark) index, joined to their bookmarks
+(`timeline_bookmarks`), instead of grouping every bookmark by every
+followed account.
+
+Fan-out costs one row per follower, so authors with at least
+TIMELINE_FANOUT_LIMIT followers are not pushed. Their public bookmarks
+are pulled when the feed is read (`timeline_filter`).
+
+Following someone backfills their newest TIMELINE_BACKFILL public
+bookmarks, and unfollowing removes their entries. Timelines are trimmed
+to their TIMELINE_MAX_LENGTH newest entries on write: after a backfill
+or a bulk fan-out, and for any one follower about every
+TIMELINE_TRIM_EVERY single-bookmark pushes, so a timeline overshoots by
+about that many entries at most. `manage.py rebuild_timelines --trim`
+trims every timeline; the full command rebuilds them all from Follow
+and Bookmark.
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models import Exists, OuterRef, Q
+
+from users.models import Bookmark, Follow, ProfileStats
+from .models import TimelineEntry
+
+TIMELINE_FANOUT_LIMIT = getattr(settings, 'TIMELINE_FANOUT_LIMIT', 5000)
+TIMELINE_BACKFILL = getattr(settings, 'TIMELINE_BACKFILL', 200)
+TIMELINE_MAX_LENGTH = getattr(settings, 'TIMELINE_MAX_LENGTH', 1000)
+TIMELINE_TRIM_EVERY = getattr(settings, 'TIMELINE_TRIM_EVERY', 20)
+BATCH_SIZE = 1000
+
+
+def is_pulled(author_id):
+    """Whether the author has too many followers to fan out to."""
+    return ProfileStats.objects.filter(user_id=author_id, followers_count__gte=TIMELINE_FANOUT_LIMIT).exists()
+
+
+def pulled_authors(user):
+    """Ids of the accounts `user` follows whose bookmarks are read at request time."""
+    return list(
+        Follow.objects.filter(follower=user, followed__stats__followers_count__gte=TIMELINE_FANOUT_LIMIT)
+        .values_list('followed_id', flat=True)
+    )
+
+
+def timeline_filter(user):
+    """
+    A filter on Bookmark selecting the bookmarks in `user`'s following
+    feed: their timeline entries plus the public bookmarks of pulled
+    authors.
+    """
+    condition = Q(id__in=TimelineEntry.objects.filter(user=user).values('bookmark_id'))
+    pulled = pulled_authors(user)
+    if pulled:
+        condition |= Q(user_id__in=pulled, access='public')
+    return condition
+
+
+def timeline_bookmarks(user, queryset, muted_ids=()):
+    """
+    Narrows a Bookmark queryset to `user`'s timeline entries, one bookmark
+    per video: the one with the lowest id, as the grouped feed picks,
+    skipping entries by `muted_ids`. Ordered by `-id` it is read through
+    the (user, bookmark) index, and each row checks for an earlier entry
+    of its video through the bookmarks of that video.
+    """
+    earlier = TimelineEntry.objects.filter(
+        user=user, bookmark__video_id=OuterRef('video_id'), bookmark_id__lt=OuterRef('pk')
+    )
+    if muted_ids:
+        earlier = earlier.exclude(author_id__in=muted_ids)
+    return queryset.filter(timeline_entries__user=user).exclude(Exists(earlier))
+
+
+def _entries(user_ids, bookmark):
+    return (
+        TimelineEntry(user_id=user_id, bookmark_id=bookmark.pk, author_id=bookmark.user_id,
+                      created_at=bookmark.created_at)
+        for user_id in user_ids
+    )
+
+
+def fan_out_bookmark(bookmark_id):
+    """Task: pushes a public bookmark into its author's followers' timelines."""
+    bookmark = Bookmark.objects.filter(pk=bookmark_id, access='public').first()
+    if bookmark is None or is_pulled(bookmark.user_id):
+        return 0
+    follower_ids = Follow.objects.filter(followed_id=bookmark.user_id).values_list('follower_id', flat=True)
+    pushed = 0
+    batch = []
+
+    def push(user_ids):
+        TimelineEntry.objects.bulk_create(_entries(user_ids, bookmark), ignore_conflicts=True)
+        # Each timeline is trimmed on about one push in TIMELINE_TRIM_EVERY,
+        # spread over followers by id so no push trims them all.
+        trim_timelines([
+            user_id for user_id in user_ids if (user_id + bookmark.pk) % TIMELINE_TRIM_EVERY == 0
+        ])
+
+    for follower_id in follower_ids.iterator(chunk_size=BATCH_SIZE):
+        batch.append(follower_id)
+        if len(batch) >= BATCH_SIZE:
+            push(batch)
+            pushed += len(batch)
+            batch = []
+    if batch:
+        push(batch)
+        pushed += len(batch)
+    return pushed
+
+
+def fan_out_bookmarks(bookmark_ids):
+    """
+    Task: fan_out_bookmark for many bookmarks at once (bulk imports), as
+    one INSERT ... SELECT over Follow, then trims every timeline written
+    to. Private bookmarks and those of pulled authors are skipped.
+    Returns the number of entries written.
+    """
+    table = TimelineEntry._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO {table} (user_id, bookmark_id, author_id, created_at)
+            SELECT f.follower_id, b.id, b.user_id, b.created_at
+            FROM {Bookmark._meta.db_table} b
+            JOIN {Follow._meta.db_table} f ON f.followed_id = b.user_id
+            WHERE b.id = ANY(%s) AND b.access = 'public'
+              AND NOT EXISTS (
+                  SELECT 1 FROM {ProfileStats._meta.db_table} s
+                  WHERE s.user_id = b.user_id AND s.followers_count >= %s
+              )
+            ON CONFLICT DO NOTHING
+            RETURNING user_id
+        """, [list(bookmark_ids), TIMELINE_FANOUT_LIMIT])
+        written = cursor.rowcount
+        user_ids = {user_id for user_id, in cursor.fetchall()}
+    trim_timelines(user_ids)
+    return written
+
+
+def remove_bookmark(bookmark_id):
+    """Takes a bookmark that is no longer public out of every timeline."""
+    TimelineEntry.objects.filter(bookmark_id=bookmark_id).delete()
+
+
+def backfill_timeline(user_id, author_id, limit=TIMELINE_BACKFILL):
+    """Task: copies an author's newest public bookmarks into a new follower's timeline."""
+    if is_pulled(author_id) or not Follow.objects.filter(follower_id=user_id, followed_id=author_id).exists():
+        return 0
+    bookmarks = Bookmark.objects.filter(user_id=author_id, access='public').order_by('-created_at')[:limit]
+    TimelineEntry.objects.bulk_create((
+        TimelineEntry(user_id=user_id, bookmark_id=bookmark.pk, author_id=author_id, created_at=bookmark.created_at)
+        for bookmark in bookmarks.only('id', 'user_id', 'created_at')
+    ), ignore_conflicts=True)
+    return trim_timelines([user_id])
+
+
+def prune_timeline(user_id, author_id):
+    """Removes an unfollowed author's bookmarks from a timeline."""
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def trim_timelines(user_ids=None, max_length=None):
+    """
+    Deletes all but the `max_length` (default TIMELINE_MAX_LENGTH) newest
+    entries, by bookmark id, of the given timelines, or of all of them
+    when `user_ids` is None. Returns the number deleted.
+    """
+    table = TimelineEntry._meta.db_table
+    if max_length is None:
+        max_length = TIMELINE_MAX_LENGTH
+    with connection.cursor() as cursor:
+        if user_ids is None:
+            cursor.execute(f"""
+                DELETE FROM {table} WHERE id IN (
+                    SELECT id FROM (
+                        SELECT id, row_number() OVER (
+                            PARTITION BY user_id ORDER BY bookmark_id DESC
+                        ) AS position
+                        FROM {table}
+                    ) ranked
+                    WHERE position > %s
+                )
+            """, [max_length])
+            return cursor.rowcount
+        user_ids = list(user_ids)
+        if not user_ids:
+            return 0
+        # Each timeline's cutoff is found in the (user, bookmark) index
+        cursor.execute(f"""
+            DELETE FROM {table} t
+            USING (
+                SELECT u.user_id, cutoff.bookmark_id
+                FROM unnest(%s::bigint[]) AS u(user_id)
+                CROSS JOIN LATERAL (
+                    SELECT bookmark_id FROM {table}
+                    WHERE user_id = u.user_id
+                    ORDER BY bookmark_id DESC
+                    OFFSET %s LIMIT 1
+                ) cutoff
+            ) c
+            WHERE t.user_id = c.user_id AND t.bookmark_id <= c.bookmark_id
+        """, [user_ids, max_length])
+        return cursor.rowcount
+
+
+def rebuild_timelines(batch_size=500, backfill=TIMELINE_BACKFILL):
+    """
+    Rebuilds every timeline from Follow and Bookmark, one follower at a
+    time in batches. Returns the number of users processed.
+    """
+    table = TimelineEntry._meta.db_table
+    fanout_limit = TIMELINE_FANOUT_LIMIT
+    follower_ids = (
+        Follow.objects.order_by('follower_id').values_list('follower_id', flat=True).distinct()
+    )
+    processed = 0
+    batch = []
+
+    def rebuild(user_ids):
+        TimelineEntry.objects.filter(user_id__in=user_ids).delete()
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                INSERT INTO {table} (user_id, bookmark_id, author_id, created_at)
+                SELECT f.follower_id, b.id, b.user_id, b.created_at
+                FROM {Follow._meta.db_table} f
+                CROSS JOIN LATERAL (
+                    SELECT id, user_id, created_at FROM {Bookmark._meta.db_table}
+                    WHERE user_id = f.followed_id AND access = 'public'
+                    ORDER BY created_at DESC LIMIT %s
+                ) b
+                WHERE f.follower_id = ANY(%s)
+                  AND NOT EXISTS (
+                      SELECT 1 FROM {ProfileStats._meta.db_table} s
+                      WHERE s.user_id = f.followed_id AND s.followers_count >= %s
+                  )
+                ON CONFLICT DO NOTHING
+            """, [backfill, list(user_ids), fanout_limit])
+        trim_timelines(user_ids)
+
+    for follower_id in follower_ids.iterator(chunk_size=batch_size):
+        batch.append(follower_id)
+        if len(batch) >= batch_size:
+            rebuild(batch)
+            processed += len(batch)
+            batch = []
+    if batch:
+        rebuild(batch)
+        processed += len(batch)
+    return processed
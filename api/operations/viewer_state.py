@@ -0,0 +1,46 @@
+"""
+Per-viewer flags for video cards: whether the current user liked the
+video, bookmarked it, and follows the video's creator. Rows that are
+bookmarks (the feed) also say whether the viewer follows the bookmark's
+author, who is usually not the creator. The two follow flags are named
+apart so a card never has to guess which user "author" means.
+
+Each flag is an EXISTS subquery annotated onto the queryset being listed,
+so a whole page of cards is answered by the query that loads it (or one
+extra query for the bulk endpoint) instead of one request per card.
+"""
+from django.db.models import Exists, OuterRef
+
+from users.models import Bookmark, Follow
+from .models import VideoLike
+
+
+def viewer_state_annotations(user, video_ref='pk', creator_ref='created_by_id', bookmarker_ref=None):
+    """
+    Annotations for `queryset.annotate(**...)`. `video_ref` and
+    `creator_ref` name the columns of the outer queryset holding the video
+    id and its creator's id. `bookmarker_ref`, for querysets of bookmarks,
+    names the column holding the bookmark author's id.
+    """
+    annotations = {
+        'viewer_is_liked': Exists(VideoLike.objects.filter(user=user, video_id=OuterRef(video_ref))),
+        'viewer_is_bookmarked': Exists(Bookmark.objects.filter(user=user, video_id=OuterRef(video_ref))),
+        'viewer_follows_creator': Exists(Follow.objects.filter(follower=user, followed_id=OuterRef(creator_ref))),
+    }
+    if bookmarker_ref:
+        annotations['viewer_follows_bookmarker'] = Exists(
+            Follow.objects.filter(follower=user, followed_id=OuterRef(bookmarker_ref))
+        )
+    return annotations
+
+
+def viewer_state(obj):
+    """Reads the annotated flags back off a row."""
+    state = {
+        'is_liked': obj.viewer_is_liked,
+        'is_bookmarked': obj.viewer_is_bookmarked,
+        'is_following_creator': obj.viewer_follows_creator,
+    }
+    if hasattr(obj, 'viewer_follows_bookmarker'):
+        state['is_following_bookmarker'] = obj.viewer_follows_bookmarker
+    return state
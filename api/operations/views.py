@@ -1,9 +1,16 @@
 from django.contrib.auth.models import User
-from django.db.models import Q, Case, When, OuterRef, Subquery, Max, Min, Count
+from django.db.models import Q, Case, When, Exists, OuterRef, Subquery, Max, Min, Count
+from django.utils.functional import cached_property
 from rest_framework import generics
-from users.models import Bookmark, Follow
+from users.models import Bookmark
 from .serializers import HomePageBookmarkSerializer, BookmarkDetailSerializer
-from operations.models import VideoLike
+from .pagination import KeysetPagination, SeededPageNumberPagination, SeededRandomPagination
+from .feed import FEED_COUNT_TIMEOUT, feed_count_key, seed_offset
+from .search import build_search_query, search_rank, substring_filter
+from .timeline import pulled_authors, timeline_bookmarks, timeline_filter
+from .viewer_state import viewer_state_annotations
+from users.mutes import exclude_muted, muted_user_ids
+from operations.models import VideoLike, Tag
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
 import random
 
@@ -14,6 +21,31 @@ class BookmarkListAPIView(generics.ListAPIView):
     """
     serializer_class = HomePageBookmarkSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    search_query = None
+    count_cache_timeout = FEED_COUNT_TIMEOUT
+
+    @property
+    def count_cache_key(self):
+        return feed_count_key(self.request.query_params, self.request.user.pk)
+
+    @property
+    def paginator(self):
+        """
+        Uses keyset pagination when the client asks for it with
+        `?pagination=cursor` (or follows a `cursor` link), and the default
+        page-number pagination otherwise. Random feeds get the seeded
+        variant of either, which returns the seed with every page.
+        """
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            wants_cursor = params.get('pagination') == 'cursor' or 'cursor' in params
+            if params.get('sort') == 'random':
+                self._paginator = SeededRandomPagination() if wants_cursor else SeededPageNumberPagination()
+            elif wants_cursor:
+                self._paginator = KeysetPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
 
     def get_queryset(self):
         """
@@ -25,10 +57,27 @@ class BookmarkListAPIView(generics.ListAPIView):
             'user', 'user__profile', 'channel', 'channel__collection', 'video'
         ).prefetch_related('video__tags')
 
+        if self._uses_feed_entries():
+            # Only video-level filters are active, so read the precomputed
+            # canonical bookmark of each video instead of grouping.
+            queryset = base_queryset.select_related('feed_entry').filter(feed_entry__isnull=False)
+            queryset = self._apply_entry_filters(queryset)
+            queryset = self._apply_search(queryset)
+            queryset = self._apply_sorting(
+                queryset, created_field='feed_entry__created_at', entry_field='feed_entry'
+            )
+            return self._apply_viewer_state(queryset)
+
         # Apply filters before grouping
         queryset = self._apply_filters(base_queryset)
         queryset = self._apply_search(queryset)
 
+        if self.reads_timeline:
+            # The timeline already holds one bookmark per video; newest
+            # bookmark first is the order of its (user, bookmark) index.
+            queryset = self._apply_sorting(queryset, created_field=None)
+            return self._apply_viewer_state(queryset)
+
         # Group by video and select the earliest bookmark for each video
         grouped_queryset = queryset.values('video').annotate(
             first_bookmark_id=Min('id')
@@ -37,10 +86,59 @@ class BookmarkListAPIView(generics.ListAPIView):
         # Filter the queryset to include only the grouped bookmarks
         queryset = queryset.filter(id__in=grouped_queryset)
 
-        return self._apply_sorting(queryset)
+        queryset = self._apply_sorting(queryset)
+        return self._apply_viewer_state(queryset)
+
+    @cached_property
+    def reads_timeline(self):
+        """
+        The following feed is read straight from the viewer's timeline
+        entries (operations.timeline.timeline_bookmarks). A `user` filter
+        narrows it enough to group instead, and so do followed accounts
+        whose bookmarks are pulled, as they have no entries.
+        """
+        params = self.request.query_params
+        user = self.request.user
+        return (
+            params.get('following') == 'true' and user.is_authenticated
+            and not params.get('user') and not pulled_authors(user)
+        )
+
+    def _uses_feed_entries(self):
+        """
+        VideoFeedEntry stores the earliest bookmark of every video, so it can
+        answer any query whose filters are video-level (search included).
+        Filters on who bookmarked (user, following) change which bookmark is
+        the earliest match, and fall back to grouping. So do mutes: a video
+        whose earliest bookmark is by a muted user is still shown, through
+        the earliest bookmark by someone else.
+        """
+        params = self.request.query_params
+        following = params.get('following') == 'true' and self.request.user.is_authenticated
+        return not (params.get('user') or following or muted_user_ids(self.request.user))
+
+    def _apply_entry_filters(self, queryset):
+        """Applies the video-level filters (orientation, liked_by, tag) to feed entries."""
+        orientation = self.request.query_params.get('orientation')
+        if orientation and orientation != 'all':
+            queryset = queryset.filter(feed_entry__orientation=orientation)
+
+        liked_by_param = self.request.query_params.get('liked_by')
+        if liked_by_param:
+            # A user likes a video at most once, so this join cannot duplicate rows
+            queryset = queryset.filter(video__likes__user__username=liked_by_param)
+
+        tag_param = self.request.query_params.get('tag')
+        if tag_param:
+            tag_ids = list(Tag.objects.filter(name__iexact=tag_param).values_list('id', flat=True))
+            if not tag_ids:
+                return queryset.none()
+            queryset = queryset.filter(feed_entry__tag_ids__overlap=tag_ids)
+
+        return queryset
 
     def _apply_filters(self, queryset):
-        """Applies filters for orientation, user, liked_by, following, and tags."""
+        """Applies filters for orientation, user, liked_by, following, tags, and mutes."""
         orientation = self.request.query_params.get('orientation')
         if orientation and orientation != 'all':
             queryset = queryset.filter(video__orientation=orientation)
@@ -60,42 +158,82 @@ class BookmarkListAPIView(generics.ListAPIView):
 
         following = self.request.query_params.get('following')
         if following == 'true' and self.request.user.is_authenticated:
-            queryset = queryset.filter(
-                user__in=Follow.objects.filter(follower=self.request.user).values('followed')
-            )
+            # Public bookmarks of followed accounts, read from the materialized timeline
+            if self.reads_timeline:
+                queryset = timeline_bookmarks(self.request.user, queryset, muted_user_ids(self.request.user))
+            else:
+                queryset = queryset.filter(timeline_filter(self.request.user))
 
         tag_param = self.request.query_params.get('tag')
         if tag_param:
-            # Filter on the video's tags
-            queryset = queryset.filter(video__tags__name__iexact=tag_param)
+            # Filter on the video's tags; EXISTS keeps one row per bookmark
+            queryset = queryset.filter(Exists(
+                Tag.objects.filter(videos=OuterRef('video_id'), name__iexact=tag_param)
+            ))
+
+        if not user_param:
+            # A profile asked for by name is shown even if muted
+            queryset = exclude_muted(queryset, self.request.user)
 
-        return queryset.distinct()
+        return queryset
 
     def _apply_search(self, queryset):
-        """Applies a search filter across multiple fields."""
+        """
+        Applies the full-text search filter on the video's search vector,
+        which covers its title, tags and bookmark texts (see operations.search).
+        """
         search = self.request.query_params.get('q')
         if search:
-            queryset = queryset.filter(
-                Q(title__icontains=search) |
-                Q(description__icontains=search) |
-                Q(video__title__icontains=search) |
-                Q(video__tags__name__icontains=search)
-            )
-        return queryset.distinct()
+            self.search_query = build_search_query(search)
+            if self.search_query is None:
+                # Nothing the tsquery can match (only stopwords or punctuation)
+                return queryset.filter(substring_filter(search))
+            queryset = queryset.filter(video__search_vector=self.search_query)
+        return queryset
 
-    def _apply_sorting(self, queryset):
-        """Applies sorting based on the 'sort' query parameter."""
+    def _apply_viewer_state(self, queryset):
+        """
+        With `?include=viewer_state`, annotates whether the current user liked
+        and bookmarked each video and follows its creator and the bookmark's
+        author, so cards need no per-video status requests.
+        """
+        includes = self.request.query_params.get('include', '').split(',')
+        if 'viewer_state' in includes and self.request.user.is_authenticated:
+            queryset = queryset.annotate(**viewer_state_annotations(
+                self.request.user, video_ref='video_id', creator_ref='video__created_by_id', bookmarker_ref='user_id'
+            ))
+        return queryset
+
+    def _apply_sorting(self, queryset, created_field='created_at', entry_field='video__feed_entry'):
+        """
+        Applies sorting based on the 'sort' query parameter.
+        Every ordering ends with the bookmark id so cursor positions are unique.
+        """
         sort_param = self.request.query_params.get('sort', 'all')
 
         if sort_param == 'popular':
+            # Materialized score, see operations.popularity for the formula. The
+            # tie-break is the video id so that vid_hotness_idx gives the order;
+            # the feed has one bookmark per video, so it is still unique.
+            queryset = queryset.order_by('-video__hotness', '-video_id')
+        elif sort_param == 'relevance' and self.search_query is not None:
             queryset = queryset.annotate(
-                bookmark_count=Count('id'),
-                like_count=Count('video__likes')
-            ).order_by('-bookmark_count', '-like_count')
+                search_rank=search_rank(self.search_query)
+            ).order_by('-search_rank', '-id')
         elif sort_param == 'random':
-            queryset = queryset.order_by('?')
+            # Seeded shuffle: read the feed entries' random keys starting at the
+            # seed's offset and wrap around. A client that keeps sending the same
+            # seed gets a stable order across pages.
+            self.random_seed = self.request.query_params.get('seed', '')[:64] or f'{random.getrandbits(32):08x}'
+            self.random_offset = seed_offset(self.random_seed)
+            self.random_key_field = f'{entry_field}__random_key'
+            # The paginators read the two laps as separate key ranges.
+            queryset = queryset.order_by(self.random_key_field, 'id')
+        elif created_field is None:
+            # Ids follow creation order; the timeline is read by bookmark id
+            queryset = queryset.order_by('-id')
         else:
-            queryset = queryset.order_by('-created_at')
+            queryset = queryset.order_by(f'-{created_field}', '-id')
 
         return queryset
 
@@ -0,0 +1,114 @@
+"""
+Avatar resizing, off the request path.
+
+An upload is stored as-is in `Profile.avatar_upload` and the profile is
+marked `pending`; the request returns at once and the previous avatar
+keeps being served. `process_avatar` then runs as a background task (see
+api.tasks):
+
+* The image is decoded once. For JPEGs, `Image.draft` lets the decoder
+  scale down by up to 8x while decoding, so a 4000px photo is never
+  expanded at full size.
+* Each of AVATAR_SIZES is produced from the next larger one and stored
+  as a JPEG named after a hash of its content, so a new avatar never
+  reuses an old URL and can be cached indefinitely.
+* The profile is switched to the new files in one UPDATE, which only
+  applies if no newer upload has arrived meanwhile. Then the previous
+  files and the upload are deleted.
+
+If decoding or storing fails, the profile is marked `failed` and the
+upload and any variants already stored are deleted.
+"""
+import hashlib
+import logging
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from api.tasks import enqueue
+from .avatars import invalidate_avatar
+from .models import Profile
+
+logger = logging.getLogger(__name__)
+
+AVATAR_SIZES = getattr(settings, 'AVATAR_SIZES', (512, 128, 64))
+JPEG_QUALITY = 85
+
+
+def start_avatar_processing(profile, upload):
+    """Stores the uploaded file and queues its resizing. Saves the profile."""
+    profile.avatar_upload = upload
+    profile.avatar_status = 'pending'
+    profile.save()
+    enqueue(process_avatar, profile.pk, profile.avatar_upload.name)
+
+
+def resize(source, sizes=AVATAR_SIZES):
+    """Returns {size: JPEG bytes} for each size, decoding `source` once."""
+    with Image.open(source) as img:
+        largest = max(sizes)
+        # Only affects JPEGs: decode at the smallest scale still >= largest
+        img.draft('RGB', (largest, largest))
+        img = ImageOps.exif_transpose(img).convert('RGB')
+    variants = {}
+    for size in sorted(sizes, reverse=True):
+        img.thumbnail((size, size), Image.LANCZOS)
+        buffer = BytesIO()
+        img.save(buffer, format='JPEG', quality=JPEG_QUALITY, optimize=True)
+        variants[size] = buffer.getvalue()
+    return variants
+
+
+def _store(username, variants, names):
+    """Saves each variant, adding its name to `names` as soon as it is written."""
+    for size, data in variants.items():
+        digest = hashlib.sha256(data).hexdigest()[:16]
+        names[str(size)] = default_storage.save(f"avatars/{username}-{digest}-{size}.jpg", ContentFile(data))
+
+
+def _delete(names):
+    for name in names:
+        try:
+            default_storage.delete(name)
+        except Exception:
+            logger.warning('Could not delete avatar file %s', name, exc_info=True)
+
+
+def process_avatar(profile_id, upload_name):
+    """Task: resizes the upload `upload_name` of a profile and makes it the avatar."""
+    profile = Profile.objects.select_related('user').filter(pk=profile_id, avatar_upload=upload_name).first()
+    if profile is None:
+        # Superseded by a newer upload, or the profile is gone
+        return
+
+    names = {}
+    try:
+        with default_storage.open(upload_name, 'rb') as f:
+            variants = resize(f)
+        _store(profile.user.username, variants, names)
+    except Exception:
+        logger.warning('Could not process avatar %s', upload_name, exc_info=True)
+        Profile.objects.filter(pk=profile_id, avatar_upload=upload_name).update(
+            avatar_status='failed', avatar_upload=None,
+        )
+        # Including the variants written before the failure
+        _delete([upload_name, *names.values()])
+        invalidate_avatar(profile_id)
+        return
+
+    main = names[str(max(AVATAR_SIZES))]
+    applied = Profile.objects.filter(pk=profile_id, avatar_upload=upload_name).update(
+        avatar=main, avatar_variants=names, avatar_status='ready', avatar_upload=None,
+    )
+    if not applied:
+        _delete(names.values())
+        return
+
+    previous = set(profile.avatar_variants.values())
+    if profile.avatar:
+        previous.add(profile.avatar.name)
+    _delete([upload_name, *(previous - set(names.values()))])
+    invalidate_avatar(profile_id)
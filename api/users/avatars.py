@@ -0,0 +1,107 @@
+"""
+Avatar URL resolution for serializers.
+
+Whether a profile's avatar file actually exists in storage is a remote
+HEAD request on Spaces/S3. The answer is cached per profile together
+with the avatar name it was computed for. It lives in CACHES 'default'
+for AVATAR_CACHE_TIMEOUT seconds, and in a small
+process-local map for AVATAR_LOCAL_CACHE_TIMEOUT seconds on top of
+that, so read paths never touch storage. An entry whose stored name no
+longer matches the profile's avatar is ignored. `Profile.save` calls
+`invalidate_avatar`, which drops the entry from both caches. Other
+processes see the change once their local entry expires.
+
+CACHES 'default' is shared between processes only when it is the Redis
+cache (REDIS_URL, see api/settings.py). Without it, it is a
+per-process memory cache, and other processes only see a change when
+their entry expires after AVATAR_CACHE_TIMEOUT.
+
+Only existence is cached. The URL itself is built from the storage
+backend on every call, so signed URLs never go stale. Resized variants
+are recorded on the profile only after they have been stored, so they
+are not checked at all.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+
+AVATAR_CACHE_TIMEOUT = getattr(settings, 'AVATAR_CACHE_TIMEOUT', 60 * 60 * 24)
+AVATAR_LOCAL_CACHE_TIMEOUT = getattr(settings, 'AVATAR_LOCAL_CACHE_TIMEOUT', 60)
+LOCAL_MAX_ENTRIES = 4096
+
+_local = OrderedDict()
+_local_lock = threading.Lock()
+
+
+def default_avatar_url():
+    return settings.MEDIA_URL + 'default.jpg'
+
+
+def _cache_key(profile_id):
+    return f'avatar-exists:{profile_id}'
+
+
+def _local_get(profile_id, name):
+    with _local_lock:
+        entry = _local.get(profile_id)
+        if entry is None:
+            return None
+        cached_name, exists, expires_at = entry
+        if cached_name != name or expires_at <= time.monotonic():
+            del _local[profile_id]
+            return None
+        return exists
+
+
+def _local_set(profile_id, name, exists):
+    with _local_lock:
+        _local[profile_id] = (name, exists, time.monotonic() + AVATAR_LOCAL_CACHE_TIMEOUT)
+        _local.move_to_end(profile_id)
+        while len(_local) > LOCAL_MAX_ENTRIES:
+            _local.popitem(last=False)
+
+
+def avatar_exists(profile):
+    """Whether `profile.avatar` is present in storage, answered from cache when possible."""
+    name = profile.avatar.name
+    exists = _local_get(profile.pk, name)
+    if exists is not None:
+        return exists
+
+    cached = cache.get(_cache_key(profile.pk))
+    if cached is not None and cached[0] == name:
+        exists = cached[1]
+    else:
+        exists = default_storage.exists(name)
+        cache.set(_cache_key(profile.pk), (name, exists), AVATAR_CACHE_TIMEOUT)
+    _local_set(profile.pk, name, exists)
+    return exists
+
+
+def avatar_url(profile, request=None, size=None):
+    """
+    Returns the profile's avatar URL, or the default avatar if it has none
+    or its file is missing. `size` picks one of the resized variants (see
+    users.avatar_processing) when it exists. Absolute when `request` is
+    given.
+    """
+    url = default_avatar_url()
+    variant = profile.avatar_variants.get(str(size)) if profile is not None and size else None
+    if variant:
+        url = default_storage.url(variant)
+    elif profile is not None and profile.avatar and avatar_exists(profile):
+        url = profile.avatar.url
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+def invalidate_avatar(profile_id):
+    """Forgets the cached existence check for a profile after its avatar changed."""
+    with _local_lock:
+        _local.pop(profile_id, None)
+    cache.delete(_cache_key(profile_id))
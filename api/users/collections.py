@@ -0,0 +1,48 @@
+"""
+Querysets for a user's collection -> channel -> bookmark library.
+
+Everything here loads in a fixed number of queries, whatever the size of
+the library:
+
+* `collection_tree` returns collections and their channels with a
+  `bookmarks_count` annotation and no bookmarks (2 queries). The
+  bookmarks of a channel are fetched page by page from
+  ChannelBookmarksListView.
+* `nested_collections` also attaches the NESTED_BOOKMARKS_PER_CHANNEL
+  newest bookmarks of each channel as `recent_bookmarks`. It uses a sliced Prefetch, which is
+  a single window-function query for all channels (4 queries with tags).
+  `nested_channels` does the same for the channels of one collection.
+"""
+from django.conf import settings
+from django.db.models import Count, Prefetch
+
+from .models import Bookmark, Channel
+
+NESTED_BOOKMARKS_PER_CHANNEL = getattr(settings, 'NESTED_BOOKMARKS_PER_CHANNEL', 20)
+
+
+def channels_with_counts():
+    # Meta.ordering is not applied to aggregated querysets
+    return Channel.objects.annotate(bookmarks_count=Count('bookmarks')).order_by('name')
+
+
+def channel_bookmarks(channel_id):
+    """A channel's bookmarks, newest first, ready for BookmarkSerializer."""
+    return Bookmark.objects.filter(channel_id=channel_id).prefetch_related('tags').order_by('-created_at', '-id')
+
+
+def collection_tree(collections):
+    return collections.prefetch_related(Prefetch('channels', queryset=channels_with_counts()))
+
+
+def nested_channels(limit=NESTED_BOOKMARKS_PER_CHANNEL):
+    """Channels with counts and their `limit` newest bookmarks in `recent_bookmarks`."""
+    bookmarks = Bookmark.objects.prefetch_related('tags').order_by('-created_at', '-id')[:limit]
+    # Django only supports a sliced Prefetch with to_attr
+    return channels_with_counts().prefetch_related(
+        Prefetch('bookmarks', queryset=bookmarks, to_attr='recent_bookmarks')
+    )
+
+
+def nested_collections(collections, limit=NESTED_BOOKMARKS_PER_CHANNEL):
+    return collections.prefetch_related(Prefetch('channels', queryset=nested_channels(limit)))
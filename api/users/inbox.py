@@ -0,0 +1,47 @@
+"""
+The notification inbox.
+
+The list is read newest first with keyset pagination, so a deep page
+costs the same as the first one. Marking notifications read is a single
+UPDATE of the requested rows, whatever their number, and the unread
+counter (see users.unread) moves by the number of rows it changed.
+Notifications from muted users are left out of the list (users.mutes);
+muting someone marks their unread ones read, so the count agrees.
+"""
+from .models import Notification
+from .mutes import exclude_muted
+from .unread import adjust_unread_count, cached_unread_count
+
+
+def inbox(user, unread_only=False):
+    """`user`'s notifications, newest first, for KeysetPagination."""
+    queryset = exclude_muted(Notification.objects.filter(recipient=user), user, field='actor')
+    if unread_only:
+        queryset = queryset.filter(is_read=False)
+    return queryset.select_related('actor', 'actor__profile').order_by('-created_at', '-id')
+
+
+def unread_count(user):
+    return cached_unread_count(
+        user.pk, lambda: Notification.objects.filter(recipient=user, is_read=False).count()
+    )
+
+
+def mark_read(user, ids=None):
+    """
+    Marks `user`'s unread notifications with the given ids read, or all of
+    them when `ids` is None. Returns the number of notifications changed.
+    """
+    queryset = Notification.objects.filter(recipient=user, is_read=False)
+    if ids is not None:
+        queryset = queryset.filter(id__in=ids)
+    updated = queryset.update(is_read=True)
+    adjust_unread_count(user.pk, -updated)
+    return updated
+
+
+def mark_read_from(user_id, actor_id):
+    """Marks the user's unread notifications from `actor_id` read, e.g. when the actor is muted."""
+    updated = Notification.objects.filter(recipient_id=user_id, actor_id=actor_id, is_read=False).update(is_read=True)
+    adjust_unread_count(user_id, -updated)
+    return updated
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.stats import rebuild_profile_stats
+
+
+class Command(BaseCommand):
+    help = "Recounts followers, following, bookmarks and likes for every user's ProfileStats row."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help="Users recounted per query.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        rebuilt = rebuild_profile_stats(batch_size=options['batch_size'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt profile stats for {rebuilt} users in {elapsed:.1f}s."
+        ))
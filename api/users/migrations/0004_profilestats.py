@@ -0,0 +1,39 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Initial values; later drift is repaired with `manage.py rebuild_profile_stats`.
+BACKFILL_SQL = """
+    INSERT INTO users_profilestats (user_id, followers_count, following_count, bookmarks_count, likes_count)
+    SELECT u.id,
+        (SELECT COUNT(*) FROM users_follow f WHERE f.followed_id = u.id),
+        (SELECT COUNT(*) FROM users_follow f WHERE f.follower_id = u.id),
+        (SELECT COUNT(*) FROM users_bookmark b WHERE b.user_id = u.id),
+        (SELECT COUNT(*) FROM operations_videolike l WHERE l.user_id = u.id)
+    FROM auth_user u
+"""
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0003_alter_profile_default_bookmark_collection_and_more'),
+        ('operations', '0008_video_source_url_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('followers_count', models.PositiveIntegerField(default=0)),
+                ('following_count', models.PositiveIntegerField(default=0)),
+                ('bookmarks_count', models.PositiveIntegerField(default=0)),
+                ('likes_count', models.PositiveIntegerField(default=0, help_text='Videos this user has liked')),
+            ],
+        ),
+        migrations.RunSQL(BACKFILL_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:58
+
+import users.models
+from django.db import migrations, models
+
+
+# Avatars uploaded before background processing are already resized
+BACKFILL_SQL = """
+    UPDATE users_profile SET avatar_status = 'ready'
+    WHERE avatar IS NOT NULL AND avatar <> ''
+"""
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_profilestats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='avatar_status',
+            field=models.CharField(choices=[('none', 'None'), ('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], default='none', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='avatar_upload',
+            field=models.ImageField(blank=True, help_text='Uploaded image waiting to be resized; see users.avatar_processing.', null=True, upload_to=users.models.avatar_original_upload_to),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='avatar_variants',
+            field=models.JSONField(blank=True, default=dict, help_text='Stored file name of each resized avatar, keyed by pixel size.'),
+        ),
+        migrations.RunSQL(BACKFILL_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Unread coalesced notifications keep their count; only their latest actor
+# is known, so a repeat by an earlier one is still counted once more.
+BACKFILL_SQL = """
+    INSERT INTO users_notificationactor (notification_id, actor_id)
+    SELECT id, actor_id FROM users_notification
+    WHERE NOT is_read AND actor_id IS NOT NULL AND notification_type IN ('video_like', 'video_bookmark')
+"""
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_notification_inbox_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationActor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('actor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('notification', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='actors', to='users.notification')),
+            ],
+            options={
+                'unique_together': {('notification', 'actor')},
+            },
+        ),
+        migrations.RunSQL(BACKFILL_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
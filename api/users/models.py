@@ -4,10 +4,10 @@ from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.utils.deconstruct import deconstructible
 from django.conf import settings
-from PIL import Image
-from io import BytesIO
-from django.core.files.base import ContentFile
+from .avatars import invalidate_avatar
+from .unread import adjust_unread_count
 import os
+import uuid
 
 # Choices
 ORIENTATION_CHOICES = [
@@ -33,6 +33,13 @@ NOTIFICATION_TYPE_CHOICES = [
     ('video_bookmark', 'Video Bookmark'),
 ]
 
+AVATAR_STATUS_CHOICES = [
+    ('none', 'None'),
+    ('pending', 'Pending'),
+    ('ready', 'Ready'),
+    ('failed', 'Failed'),
+]
+
 SUBSCRIPTION_TIER_CHOICES = [
     ('premium', 'Premium'),
     # Add other tiers here if needed in the future
@@ -50,10 +57,26 @@ def avatar_upload_to(instance, filename):
     username = instance.user.username
     return f"avatars/{username}{ext}"
 
+def avatar_original_upload_to(instance, filename):
+    ext = os.path.splitext(filename)[1].lower()
+    return f"avatars/uploads/{instance.user.username}-{uuid.uuid4().hex[:12]}{ext}"
+
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     bio = models.TextField(blank=True, null=True)
     avatar = models.ImageField(upload_to=avatar_upload_to, blank=True, null=True)
+    avatar_upload = models.ImageField(
+        upload_to=avatar_original_upload_to,
+        blank=True,
+        null=True,
+        help_text="Uploaded image waiting to be resized; see users.avatar_processing."
+    )
+    avatar_status = models.CharField(max_length=10, choices=AVATAR_STATUS_CHOICES, default='none')
+    avatar_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text="Stored file name of each resized avatar, keyed by pixel size."
+    )
 
     # --- User Preferences ---
     default_bookmark_orientation = models.CharField(
@@ -95,40 +118,22 @@ class Profile(models.Model):
 
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
-        if self.avatar:
-            username = self.user.username
-            avatar_path = self.avatar.name
-
-            from django.core.files.storage import default_storage
-
-            if default_storage.exists(avatar_path):
-                with default_storage.open(avatar_path, 'rb') as f:
-                    img = Image.open(f)
-                    img = img.convert('RGB')
-                    img.thumbnail((512, 512), Image.LANCZOS)
-                    buffer = BytesIO()
-                    img.save(buffer, format='JPEG', quality=85, optimize=True)
-                    new_filename = f"avatars/{username}.jpg"
-
-                    # Delete old avatar file if it exists
-                    if default_storage.exists(new_filename):
-                        default_storage.delete(new_filename)
-
-                    # Save processed image and update the field to point to the canonical filename
-                    self.avatar.save(new_filename, ContentFile(buffer.getvalue()), save=False)
-                    self.avatar.name = new_filename
-                    buffer.close()
-
-                # Remove other avatar files for this user
-                avatar_dir = os.path.join(settings.MEDIA_ROOT, 'avatars')
-                for fname in os.listdir(avatar_dir):
-                    if fname.startswith(username) and fname != f"{username}.jpg":
-                        try:
-                            os.remove(os.path.join(avatar_dir, fname))
-                        except Exception:
-                            pass
-
-                super().save(update_fields=['avatar'])
+        # The avatar may have changed; resizing is done by users.avatar_processing
+        invalidate_avatar(self.pk)
+
+class ProfileStats(models.Model):
+    """
+    Denormalized profile counters, one row per user. Kept current by
+    users.signals on follow, bookmark and like writes; see users.stats.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    bookmarks_count = models.PositiveIntegerField(default=0)
+    likes_count = models.PositiveIntegerField(default=0, help_text="Videos this user has liked")
+
+    def __str__(self):
+        return f"Stats for {self.user.username}"
 
 class Collection(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='collections')
@@ -231,13 +236,20 @@ class Notification(models.Model):
     action_object_object_id = models.PositiveIntegerField(null=True, blank=True)
     action_object = GenericForeignKey('action_object_content_type', 'action_object_object_id')
 
+    actor_count = models.PositiveIntegerField(
+        default=1,
+        help_text="Number of users whose actions were coalesced into this notification; `actor` is the latest."
+    )
+
     is_read = models.BooleanField(default=False, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['recipient', 'is_read', '-created_at'])
+            models.Index(fields=['recipient', 'is_read', '-created_at']),
+            # The inbox, read newest first with keyset pagination (users.inbox)
+            models.Index(fields=['recipient', '-created_at', '-id'], name='ntf_rcp_crt_idx'),
         ]
         verbose_name = "Notification"
         verbose_name_plural = "Notifications"
@@ -255,11 +267,21 @@ class Notification(models.Model):
         if not self.is_read:
             self.is_read = True
             self.save(update_fields=['is_read'])
+            adjust_unread_count(self.recipient_id, -1)
 
     def mark_as_unread(self):
         if self.is_read:
             self.is_read = False
             self.save(update_fields=['is_read'])
+            adjust_unread_count(self.recipient_id, 1)
+
+class NotificationActor(models.Model):
+    """A user whose action was coalesced into a notification; `actor_count` counts these rows."""
+    notification = models.ForeignKey(Notification, related_name='actors', on_delete=models.CASCADE)
+    actor = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE)
+
+    class Meta:
+        unique_together = ('notification', 'actor')
 
 class Subscription(models.Model):
     """
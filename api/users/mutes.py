@@ -0,0 +1,49 @@
+"""
+Muted users, applied inside the feed and inbox queries.
+
+Muted authors are excluded in SQL with a NOT EXISTS anti-join on
+MutedUser, before pagination, so pages keep their size. An anti-join
+lets the planner hash the mute list once. A NOT IN over a literal id
+list would grow the query text with every mute.
+
+Most users mute nobody. Each user's muted ids are cached for
+MUTED_IDS_TIMEOUT seconds, so for them `exclude_muted` adds nothing to
+the query at all, and checking costs one cache lookup. `users.signals`
+drops the cached set when a mute is added or removed. The other workers
+must see that, so this relies on the shared Redis cache (REDIS_URL, see
+api/settings.py).
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef
+
+from .models import MutedUser
+
+MUTED_IDS_TIMEOUT = getattr(settings, 'MUTED_IDS_TIMEOUT', 60 * 60)
+
+
+def muted_ids_key(user_id):
+    return f"muted-users:{user_id}"
+
+
+def muted_user_ids(user):
+    """The ids of the users `user` has muted, as a frozenset."""
+    if not user.is_authenticated:
+        return frozenset()
+    key = muted_ids_key(user.pk)
+    ids = cache.get(key)
+    if ids is None:
+        ids = list(MutedUser.objects.filter(user=user).values_list('muted_user_id', flat=True))
+        cache.set(key, ids, MUTED_IDS_TIMEOUT)
+    return frozenset(ids)
+
+
+def invalidate_muted_ids(user_id):
+    cache.delete(muted_ids_key(user_id))
+
+
+def exclude_muted(queryset, user, field='user'):
+    """Drops the rows of `queryset` whose `field` (a user FK) is muted by `user`."""
+    if not muted_user_ids(user):
+        return queryset
+    return queryset.exclude(Exists(MutedUser.objects.filter(user=user, muted_user=OuterRef(field))))
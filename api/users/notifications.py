@@ -0,0 +1,166 @@
+"""
+Notification delivery, off the request path.
+
+`users.signals` turns follow, like and bookmark writes into events with
+`emit(kind, actor_id, object_id)`. Each event is queued as a background
+task (see api.tasks), so a bookmark by an account with 10k followers
+costs its request nothing. The `deliver` worker then:
+
+* resolves the recipients in one query. That query applies the
+  recipient's `notify_on_*` preference and skips recipients who have
+  muted the actor (a NOT EXISTS on MutedUser), and never selects the
+  actor;
+* writes the rows with `bulk_create`, NOTIFICATION_BATCH_SIZE at a time,
+  keeps the recipients' unread counts current (see users.unread) and
+  wakes up their open event streams (see users.stream).
+
+Likes and bookmarks of a video are coalesced. While the owner has an
+unread notification for the video, later likes update that row (latest
+actor, `actor_count` + 1 for someone new, moved to the top) instead of
+adding rows. The owner then sees "N people liked your video".
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
+
+from api.broadcast import publish
+from api.tasks import enqueue
+from operations.models import Video
+from .models import Bookmark, MutedUser, Notification, NotificationActor
+from .unread import adjust_unread_count, invalidate_unread_counts
+
+NOTIFICATION_BATCH_SIZE = getattr(settings, 'NOTIFICATION_BATCH_SIZE', 1000)
+
+
+def emit(kind, actor_id, object_id):
+    """Queues the event `kind` ('follow', 'like' or 'bookmark') for delivery once the transaction commits."""
+    enqueue(deliver, kind, actor_id, object_id)
+
+
+def recipients(users, preference, actor_id):
+    """
+    Ids of `users` (a User queryset) who want notifications of this kind
+    from `actor_id`, as a lazy values_list.
+    """
+    muted = MutedUser.objects.filter(user=OuterRef('pk'), muted_user_id=actor_id)
+    return (
+        users.filter(**{f'profile__{preference}': True})
+        .exclude(pk=actor_id)
+        .exclude(Exists(muted))
+        .values_list('pk', flat=True)
+    )
+
+
+def notify(recipient_ids, actor_id, notification_type, verb, target=None, action_object=None):
+    """Creates one notification per recipient, in batches. Returns the number created."""
+    fields = {'actor_id': actor_id, 'notification_type': notification_type, 'verb': verb}
+    if target is not None:
+        fields.update(target_content_type=ContentType.objects.get_for_model(target), target_object_id=target.pk)
+    if action_object is not None:
+        fields.update(
+            action_object_content_type=ContentType.objects.get_for_model(action_object),
+            action_object_object_id=action_object.pk,
+        )
+    created = 0
+    batch = []
+    for recipient_id in recipient_ids.iterator(chunk_size=NOTIFICATION_BATCH_SIZE):
+        batch.append(recipient_id)
+        if len(batch) >= NOTIFICATION_BATCH_SIZE:
+            created += _create_batch(batch, fields)
+            batch = []
+    if batch:
+        created += _create_batch(batch, fields)
+    return created
+
+
+def _create_batch(recipient_ids, fields):
+    Notification.objects.bulk_create([Notification(recipient_id=pk, **fields) for pk in recipient_ids])
+    invalidate_unread_counts(recipient_ids)
+    _announce(recipient_ids)
+    return len(recipient_ids)
+
+
+def _announce(recipient_ids):
+    """Tells the recipients' open event streams to read their inbox (users.stream)."""
+    publish([f"user:{pk}" for pk in recipient_ids], {'event': 'notifications'})
+
+
+def notify_coalesced(recipient_id, actor_id, notification_type, verb, target):
+    """
+    Folds the event into the recipient's unread notification of the same
+    type and target, or creates one. `actor_count` is the number of
+    distinct users folded in (NotificationActor rows): an actor repeating
+    the action, e.g. unlike and like again, is not counted twice.
+
+    Runs under a lock on the recipient's user row, so two workers
+    delivering events to the same recipient cannot both create the
+    notification or lose each other's increment.
+    """
+    with transaction.atomic():
+        list(User.objects.select_for_update().filter(pk=recipient_id).values_list('pk'))
+        pending = Notification.objects.filter(
+            recipient_id=recipient_id, is_read=False, notification_type=notification_type,
+            target_content_type=ContentType.objects.get_for_model(target), target_object_id=target.pk,
+        ).order_by('-created_at', '-id').first()
+        if pending is None:
+            notification = Notification.objects.create(
+                recipient_id=recipient_id, actor_id=actor_id, notification_type=notification_type, verb=verb,
+                target=target,
+            )
+            NotificationActor.objects.create(notification=notification, actor_id=actor_id)
+        else:
+            notification = None
+            _, new_actor = NotificationActor.objects.get_or_create(notification=pending, actor_id=actor_id)
+            if not new_actor and pending.actor_id == actor_id:
+                return None
+            Notification.objects.filter(pk=pending.pk).update(
+                actor_id=actor_id, actor_count=F('actor_count') + int(new_actor), created_at=timezone.now(),
+            )
+    if notification is not None:
+        adjust_unread_count(recipient_id, 1)
+    _announce([recipient_id])
+    return notification
+
+
+def _follow(actor_id, followed_id):
+    notify(recipients(User.objects.filter(pk=followed_id), 'notify_on_follow', actor_id),
+           actor_id, 'follow', 'started following you')
+
+
+def _like(actor_id, video_id):
+    video = Video.objects.filter(pk=video_id, created_by__isnull=False).first()
+    if video is None:
+        return
+    for recipient_id in recipients(User.objects.filter(pk=video.created_by_id), 'notify_on_own_video_liked', actor_id):
+        notify_coalesced(recipient_id, actor_id, 'video_like', 'liked your video', video)
+
+
+def _bookmark(actor_id, bookmark_id):
+    bookmark = Bookmark.objects.select_related('video').filter(pk=bookmark_id, access='public').first()
+    if bookmark is None:
+        # Deleted meanwhile, or private: nobody else should hear about it
+        return
+    video = bookmark.video
+    if video.created_by_id:
+        owner = recipients(User.objects.filter(pk=video.created_by_id), 'notify_on_own_video_bookmarked', actor_id)
+        for recipient_id in owner:
+            notify_coalesced(recipient_id, actor_id, 'video_bookmark', 'bookmarked your video', video)
+    followers = recipients(
+        User.objects.filter(following__followed_id=actor_id), 'notify_on_new_bookmark_from_followed_user', actor_id,
+    )
+    notify(followers, actor_id, 'new_content', 'bookmarked a video', target=video, action_object=bookmark)
+
+
+HANDLERS = {
+    'follow': _follow,
+    'like': _like,
+    'bookmark': _bookmark,
+}
+
+
+def deliver(kind, actor_id, object_id):
+    """Task: creates the notifications for one event."""
+    HANDLERS[kind](actor_id, object_id)
@@ -1,10 +1,14 @@
 from rest_framework import serializers
-from users.models import Profile, Collection, Channel, Bookmark, Follow
-from operations.models import Tag
+from django.contrib.contenttypes.models import ContentType
+from users.models import Profile, Collection, Channel, Bookmark, Notification
+from operations.tags import tag_ids
 from django.contrib.auth.models import User
 from operations.models import Video  # adjust import as needed
-from django.conf import settings
-from django.core.files.storage import default_storage
+from users.avatars import avatar_url
+from users.avatar_processing import start_avatar_processing
+from users.stats import get_profile_stats
+from users.collections import nested_collections
+from operations.serializers import UserPublicSerializer
 
 class BookmarkSerializer(serializers.ModelSerializer):
     channel = serializers.PrimaryKeyRelatedField(
@@ -33,19 +37,23 @@ class BookmarkSerializer(serializers.ModelSerializer):
         tags_data = validated_data.pop('tags', [])
         validated_data.pop('collection', None)
         bookmark = super().create(validated_data)
-        tag_objs = []
-        for tag_name in tags_data:
-            tag, _ = Tag.objects.get_or_create(name=tag_name)
-            tag_objs.append(tag)
-        bookmark.tags.set(tag_objs)
+        bookmark.tags.set(tag_ids(tags_data))
         return bookmark
 
 class ChannelSerializer(serializers.ModelSerializer):
-    bookmarks = BookmarkSerializer(many=True, read_only=True)
+    # Only the newest bookmarks are nested (see users.collections);
+    # `bookmarks_truncated` says whether there are more, and the full list
+    # is paginated at /api/channels/<id>/bookmarks/.
+    bookmarks = BookmarkSerializer(source='recent_bookmarks', many=True, read_only=True)
+    bookmarks_count = serializers.IntegerField(read_only=True)
+    bookmarks_truncated = serializers.SerializerMethodField()
 
     class Meta:
         model = Channel
-        fields = ['id', 'name', 'description', 'imageUrl', 'bookmarks']
+        fields = ['id', 'name', 'description', 'imageUrl', 'bookmarks_count', 'bookmarks_truncated', 'bookmarks']
+
+    def get_bookmarks_truncated(self, obj):
+        return obj.bookmarks_count > len(obj.recent_bookmarks)
 
 class CollectionSerializer(serializers.ModelSerializer):
     channels = ChannelSerializer(many=True, read_only=True)
@@ -54,6 +62,20 @@ class CollectionSerializer(serializers.ModelSerializer):
         model = Collection
         fields = ['id', 'name', 'description', 'imageUrl', 'channels']
 
+class ChannelSummarySerializer(serializers.ModelSerializer):
+    bookmarks_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Channel
+        fields = ['id', 'name', 'description', 'imageUrl', 'bookmarks_count']
+
+class CollectionTreeSerializer(serializers.ModelSerializer):
+    channels = ChannelSummarySerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Collection
+        fields = ['id', 'name', 'description', 'imageUrl', 'channels']
+
 class UserProfileDetailSerializer(serializers.ModelSerializer):
     collections = serializers.SerializerMethodField()
     followers_count = serializers.SerializerMethodField()
@@ -70,59 +92,50 @@ class UserProfileDetailSerializer(serializers.ModelSerializer):
     class Meta:
         model = Profile
         fields = [
-            'username', 'bio', 'avatar', 'avatar_url',
+            'username', 'bio', 'avatar', 'avatar_url', 'avatar_status',
             'collections', 'followers_count', 'following_count',
             'bookmarks_count', 'likes_count'
         ]
-        read_only_fields = ['username', 'avatar_url', 'collections', 'followers_count', 'following_count', 'bookmarks_count', 'likes_count']
+        read_only_fields = ['username', 'avatar_url', 'avatar_status', 'collections', 'followers_count', 'following_count', 'bookmarks_count', 'likes_count']
 
     def get_collections(self, obj):
-        collections = Collection.objects.filter(user=obj.user)
+        collections = nested_collections(Collection.objects.filter(user=obj.user))
         return CollectionSerializer(collections, many=True).data
 
+    # The four counters come from the user's ProfileStats row (see users.stats)
     def get_followers_count(self, obj):
-        return Follow.objects.filter(followed=obj.user).count()
+        return get_profile_stats(obj.user).followers_count
 
     def get_following_count(self, obj):
-        return Follow.objects.filter(follower=obj.user).count()
+        return get_profile_stats(obj.user).following_count
 
     def get_bookmarks_count(self, obj):
-        return Bookmark.objects.filter(user=obj.user).count()
+        return get_profile_stats(obj.user).bookmarks_count
 
     def get_likes_count(self, obj):
-        from operations.models import VideoLike
-        return VideoLike.objects.filter(user=obj.user).count()
+        return get_profile_stats(obj.user).likes_count
 
     def get_avatar_url(self, obj):
-        request = self.context.get('request')
-        # Check if avatar exists and file is present
-        if obj.avatar and hasattr(obj.avatar, 'url'):
-            avatar_path = obj.avatar.name
-            if default_storage.exists(avatar_path):
-                if request is not None:
-                    return request.build_absolute_uri(obj.avatar.url)
-                return obj.avatar.url
-        # Return a default image URL (absolute if possible)
-        default_url = settings.MEDIA_URL + 'default.jpg'
-        if request is not None:
-            return request.build_absolute_uri(default_url)
-        return default_url
+        # Falls back to the default image; absolute when there is a request
+        return avatar_url(obj, self.context.get('request'))
 
     def update(self, instance, validated_data):
-        # Handle avatar update
-        avatar = validated_data.pop('avatar', None)
-        if avatar is not None:
-            instance.avatar = avatar
         # Handle bio update
         bio = validated_data.get('bio', None)
         if bio is not None:
             instance.bio = bio
-        instance.save()
+        # Handle avatar update; it is resized in the background
+        avatar = validated_data.pop('avatar', None)
+        if avatar is not None:
+            start_avatar_processing(instance, avatar)
+        else:
+            instance.save()
         return instance
 
 class UserProfileSerializer(serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
     email = serializers.EmailField(source='user.email', read_only=True)
+    avatar = serializers.ImageField(required=False, allow_null=True, write_only=True)
     avatar_url = serializers.SerializerMethodField()
     default_bookmark_orientation = serializers.CharField(required=False, allow_blank=True)
     default_bookmark_collection = serializers.PrimaryKeyRelatedField(
@@ -139,7 +152,9 @@ class UserProfileSerializer(serializers.ModelSerializer):
             "username",
             "email",
             "bio",
+            "avatar",
             "avatar_url",
+            "avatar_status",
             "default_bookmark_orientation",
             "default_bookmark_collection",
             "notify_on_follow",
@@ -147,18 +162,43 @@ class UserProfileSerializer(serializers.ModelSerializer):
             "notify_on_new_bookmark_from_followed_user",
             "notify_on_own_video_liked",
         ]
+        read_only_fields = ["avatar_status"]
 
     def get_avatar_url(self, obj):
-        request = self.context.get('request')
-        # Check if avatar exists and file is present
-        if obj.avatar and hasattr(obj.avatar, 'url'):
-            avatar_path = obj.avatar.name
-            if default_storage.exists(avatar_path):
-                if request is not None:
-                    return request.build_absolute_uri(obj.avatar.url)
-                return obj.avatar.url
-        # Return a default image URL (absolute if possible)
-        default_url = settings.MEDIA_URL + 'default.jpg'
-        if request is not None:
-            return request.build_absolute_uri(default_url)
-        return default_url
\ No newline at end of file
+        # Falls back to the default image; absolute when there is a request
+        return avatar_url(obj, self.context.get('request'))
+
+    def update(self, instance, validated_data):
+        # The avatar is stored as an upload and resized in the background
+        avatar = validated_data.pop('avatar', None)
+        instance = super().update(instance, validated_data)
+        if avatar is not None:
+            start_avatar_processing(instance, avatar)
+        return instance
+
+class NotificationSerializer(serializers.ModelSerializer):
+    actor = UserPublicSerializer(read_only=True)
+    target_type = serializers.SerializerMethodField()
+    action_object_type = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Notification
+        fields = [
+            'id', 'notification_type', 'verb', 'actor', 'actor_count',
+            'target_type', 'target_object_id', 'action_object_type', 'action_object_object_id',
+            'is_read', 'created_at',
+        ]
+
+    def _model_name(self, content_type_id):
+        # get_for_id is served from ContentType's own cache
+        return ContentType.objects.get_for_id(content_type_id).model if content_type_id else None
+
+    def get_target_type(self, obj):
+        return self._model_name(obj.target_content_type_id)
+
+    def get_action_object_type(self, obj):
+        return self._model_name(obj.action_object_content_type_id)
+
+class MarkNotificationsReadSerializer(serializers.Serializer):
+    """`ids` to mark read; all unread notifications when omitted."""
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, max_length=1000)
@@ -1,12 +1,19 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import Profile, Collection, Channel
+from operations.models import VideoLike
+from .models import Profile, Collection, Channel, Follow, Bookmark, ProfileStats, MutedUser
+from .inbox import mark_read_from
+from .mutes import invalidate_muted_ids
+from .notifications import emit
+from .stats import bump_profile_stats
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
         profile = Profile.objects.create(user=instance)
+        ProfileStats.objects.create(user=instance)
         # Create a Collection with the user's username
         collection = Collection.objects.create(
             user=instance,
@@ -18,4 +25,66 @@ def create_user_profile(sender, instance, created, **kwargs):
             collection=collection,
             name=f"{instance.username}'s channel",
             description=f"Default channel for {instance.username}"
-        )
\ No newline at end of file
+        )
+
+# --- ProfileStats counters, see users.stats ---
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, **kwargs):
+    if created:
+        bump_profile_stats(instance.followed_id, followers_count=1)
+        bump_profile_stats(instance.follower_id, following_count=1)
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    bump_profile_stats(instance.followed_id, followers_count=-1)
+    bump_profile_stats(instance.follower_id, following_count=-1)
+
+@receiver(post_save, sender=Bookmark)
+def count_bookmark(sender, instance, created, **kwargs):
+    if created:
+        bump_profile_stats(instance.user_id, bookmarks_count=1)
+
+@receiver(post_delete, sender=Bookmark)
+def uncount_bookmark(sender, instance, **kwargs):
+    bump_profile_stats(instance.user_id, bookmarks_count=-1)
+
+@receiver(post_save, sender=VideoLike)
+def count_like(sender, instance, created, **kwargs):
+    if created:
+        bump_profile_stats(instance.user_id, likes_count=1)
+
+@receiver(post_delete, sender=VideoLike)
+def uncount_like(sender, instance, **kwargs):
+    bump_profile_stats(instance.user_id, likes_count=-1)
+
+# --- Notifications, delivered in the background by users.notifications ---
+
+@receiver(post_save, sender=Follow)
+def notify_follow(sender, instance, created, **kwargs):
+    if created:
+        emit('follow', instance.follower_id, instance.followed_id)
+
+@receiver(post_save, sender=Bookmark)
+def notify_bookmark(sender, instance, created, **kwargs):
+    if created and instance.access == 'public':
+        emit('bookmark', instance.user_id, instance.pk)
+
+@receiver(post_save, sender=VideoLike)
+def notify_like(sender, instance, created, **kwargs):
+    if created:
+        emit('like', instance.user_id, instance.video_id)
+
+# --- Cached mute sets, see users.mutes ---
+
+@receiver(post_save, sender=MutedUser)
+def mute_saved(sender, instance, created, **kwargs):
+    user_id = instance.user_id
+    transaction.on_commit(lambda: invalidate_muted_ids(user_id))
+    if created:
+        mark_read_from(user_id, instance.muted_user_id)
+
+@receiver(post_delete, sender=MutedUser)
+def mute_deleted(sender, instance, **kwargs):
+    user_id = instance.user_id
+    transaction.on_commit(lambda: invalidate_muted_ids(user_id))
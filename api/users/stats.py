@@ -0,0 +1,75 @@
+"""
+Denormalized profile counters (`ProfileStats`).
+
+`users.signals` moves the counters by one with F() UPDATEs on every
+follow, bookmark and like write, so a profile view reads all four numbers
+from a single row instead of running four COUNT(*) queries. A row is
+created with the user. For users created before the table existed, the
+row is computed on first read. `manage.py rebuild_profile_stats`
+recounts everything to repair drift.
+"""
+from django.contrib.auth.models import User
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from operations.models import VideoLike
+from .models import Bookmark, Follow, ProfileStats
+
+COUNTERS = ('followers_count', 'following_count', 'bookmarks_count', 'likes_count')
+
+
+def bump_profile_stats(user_id, **deltas):
+    """
+    Applies counter deltas (e.g. `followers_count=1`) in one UPDATE. Users
+    without a stats row are left alone; their row is computed when read.
+    """
+    return ProfileStats.objects.filter(user_id=user_id).update(**{
+        field: Greatest(F(field) + delta, Value(0)) for field, delta in deltas.items()
+    })
+
+
+def _count(queryset, field):
+    rows = queryset.filter(**{field: OuterRef('pk')}).order_by().values(field)
+    return Coalesce(Subquery(rows.annotate(n=Count('pk')).values('n')), 0)
+
+
+def refresh_profile_stats(user_ids):
+    """Recounts the given users' stats from the source tables in one query and upserts them."""
+    counts = User.objects.filter(pk__in=user_ids).annotate(
+        n_followers=_count(Follow.objects, 'followed'),
+        n_following=_count(Follow.objects, 'follower'),
+        n_bookmarks=_count(Bookmark.objects, 'user'),
+        n_likes=_count(VideoLike.objects, 'user'),
+    ).values_list('pk', 'n_followers', 'n_following', 'n_bookmarks', 'n_likes')
+    stats = [
+        ProfileStats(
+            user_id=pk, followers_count=followers, following_count=following,
+            bookmarks_count=bookmarks, likes_count=likes,
+        )
+        for pk, followers, following, bookmarks, likes in counts
+    ]
+    if stats:
+        ProfileStats.objects.bulk_create(
+            stats, update_conflicts=True, unique_fields=['user'], update_fields=list(COUNTERS)
+        )
+    return stats
+
+
+def get_profile_stats(user):
+    """Returns the user's stats row, computing it if it does not exist yet."""
+    try:
+        return user.stats
+    except ProfileStats.DoesNotExist:
+        return refresh_profile_stats([user.pk])[0]
+
+
+def rebuild_profile_stats(batch_size=2000):
+    """Recounts every user's stats, one primary key range at a time. Returns the number of users."""
+    rebuilt = 0
+    last_pk = User.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+    for start in range(0, last_pk + 1, batch_size):
+        user_ids = list(
+            User.objects.filter(pk__gte=start, pk__lt=start + batch_size).values_list('pk', flat=True)
+        )
+        rebuilt += len(refresh_profile_stats(user_ids))
+    return rebuilt
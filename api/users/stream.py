@@ -0,0 +1,145 @@
+"""
+The event stream (Server-Sent Events) behind /api/events/.
+
+One long-lived connection per client replaces polling the unread count,
+the inbox and like counts. The stream subscribes to the api.broadcast hub
+for the user's own topic and for the videos it asked about. It sends:
+
+* `notification`: each new notification, or one that a coalesced event
+  moved to the top. The event id is the notification's `created_at`, so
+  a reconnecting client that sends Last-Event-ID first receives what it
+  missed (up to STREAM_CATCH_UP_LIMIT), then the current `unread_count`;
+* `unread_count`: after each batch of notifications;
+* `likes`: `{video_id, likes_count}` when a subscribed video is liked or
+  unliked.
+
+Broadcast messages only say that something changed for the user. The
+stream then reads the new notifications itself, from the inbox index.
+Each read closes its database connection (returns it to the pool) before
+the stream goes back to waiting. An idle stream holds no connection.
+
+Comment lines are sent every STREAM_KEEPALIVE_SECONDS so that proxies
+keep the connection open. Streams end after STREAM_MAX_SECONDS, or when
+the client falls too far behind.
+
+EventSource cannot send an Authorization header, so the stream is opened
+with `?token=`. This is a stream token from `issue_stream_token` (POST
+/api/events/token/), not the access token. It is signed, only valid for
+opening streams, and expires after STREAM_TOKEN_MAX_AGE seconds, so the
+copies in access logs are useless. Clients fetch a fresh token before
+every (re)connect.
+"""
+import asyncio
+import json
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.db import connection
+from django.utils import timezone
+
+from api.broadcast import subscribe
+from .inbox import unread_count
+from .models import Notification
+from .mutes import exclude_muted
+from .serializers import NotificationSerializer
+
+STREAM_KEEPALIVE_SECONDS = getattr(settings, 'STREAM_KEEPALIVE_SECONDS', 15)
+STREAM_MAX_SECONDS = getattr(settings, 'STREAM_MAX_SECONDS', 60 * 30)
+STREAM_RETRY_MILLISECONDS = 5000
+STREAM_CATCH_UP_LIMIT = 50
+STREAM_MAX_VIDEOS = 100
+STREAM_TOKEN_MAX_AGE = getattr(settings, 'STREAM_TOKEN_MAX_AGE', 60)
+STREAM_TOKEN_SALT = 'users.stream'
+
+
+def issue_stream_token(user):
+    return signing.dumps({'u': user.pk}, salt=STREAM_TOKEN_SALT, compress=True)
+
+
+def stream_token_user_id(token):
+    """The user id in a valid, unexpired stream token, or None."""
+    try:
+        return signing.loads(token, salt=STREAM_TOKEN_SALT, max_age=STREAM_TOKEN_MAX_AGE)['u']
+    except (signing.BadSignature, KeyError, TypeError):
+        return None
+
+
+def user_topic(user_id):
+    return f"user:{user_id}"
+
+
+def video_topic(video_id):
+    return f"video:{video_id}"
+
+
+def parse_event_id(value):
+    """The position in a Last-Event-ID header, or None."""
+    try:
+        position = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    return position if timezone.is_aware(position) else None
+
+
+def _format(event, data, event_id=None):
+    lines = [f"event: {event}"]
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+def _notifications_since(user, position):
+    """The serialized notifications moved after `position`, oldest first, and the unread count."""
+    try:
+        rows = list(
+            exclude_muted(Notification.objects.filter(recipient=user, created_at__gt=position), user, field='actor')
+            .select_related('actor', 'actor__profile')
+            .order_by('-created_at', '-id')[:STREAM_CATCH_UP_LIMIT]
+        )
+        rows.reverse()
+        return [(row.created_at, NotificationSerializer(row).data) for row in rows], unread_count(user)
+    finally:
+        # Django would only release it when the stream ends (request_finished)
+        connection.close()
+
+
+async def event_stream(user, video_ids=(), last_event_id=None):
+    """Yields the SSE text of `user`'s stream until it times out or the client goes away."""
+    subscription = subscribe([user_topic(user.pk), *(video_topic(video_id) for video_id in video_ids)])
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + STREAM_MAX_SECONDS
+    position = parse_event_id(last_event_id) or timezone.now()
+    try:
+        yield f"retry: {STREAM_RETRY_MILLISECONDS}\n\n"
+        pending = True  # Catch up (or just send the count) first
+        while True:
+            if pending:
+                rows, count = await sync_to_async(_notifications_since)(user, position)
+                for created_at, data in rows:
+                    position = created_at
+                    yield _format('notification', data, event_id=created_at.isoformat())
+                yield _format('unread_count', {'unread_count': count})
+                pending = False
+
+            remaining = deadline - loop.time()
+            if remaining <= 0 or subscription.overflowed:
+                return
+            try:
+                messages = [await asyncio.wait_for(subscription.get(), min(STREAM_KEEPALIVE_SECONDS, remaining))]
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            # A burst is answered with one read of the inbox
+            while not subscription.queue.empty():
+                messages.append(subscription.queue.get_nowait())
+
+            for message in messages:
+                if message.get('event') == 'notifications':
+                    pending = True
+                elif message.get('event') == 'likes':
+                    yield _format('likes', {'video_id': message['video_id'], 'likes_count': message['likes_count']})
+    finally:
+        subscription.close()
@@ -1,3 +1,248 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from operations.models import Tag, Video
+from .inbox import mark_read, unread_count
+from .collections import NESTED_BOOKMARKS_PER_CHANNEL
+from .models import Bookmark, Channel, Collection, Follow, MutedUser, Notification
+from .notifications import deliver
+from .unread import adjust_unread_count, cached_unread_count, unread_count_key
+
+
+class NotificationTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', 'owner@example.com', 'password')
+        cls.fans = [User.objects.create_user(f'fan{i}', f'fan{i}@example.com', 'password') for i in range(3)]
+        cls.video = Video.objects.create(source_url='https://example.com/v', title='Video', created_by=cls.owner)
+
+    def setUp(self):
+        cache.clear()
+
+    def cached_count(self, user):
+        return cache.get(unread_count_key(user.pk))
+
+    def unread_rows(self, user):
+        return Notification.objects.filter(recipient=user, is_read=False).count()
+
+
+class CoalescingTests(NotificationTestCase):
+    def test_likes_fold_into_one_unread_notification(self):
+        self.assertEqual(unread_count(self.owner), 0)
+        for fan in self.fans:
+            deliver('like', fan.pk, self.video.pk)
+
+        notification = Notification.objects.get(recipient=self.owner)
+        self.assertEqual(notification.actor_id, self.fans[-1].pk)
+        self.assertEqual(notification.actor_count, 3)
+        self.assertEqual(notification.notification_type, 'video_like')
+        self.assertEqual(self.cached_count(self.owner), 1)
+        self.assertEqual(unread_count(self.owner), 1)
+
+    def test_latest_actor_repeating_is_not_counted_twice(self):
+        deliver('like', self.fans[0].pk, self.video.pk)
+        deliver('like', self.fans[0].pk, self.video.pk)
+        self.assertEqual(Notification.objects.get(recipient=self.owner).actor_count, 1)
+
+    def test_actor_count_counts_people_not_events(self):
+        for fan in [self.fans[0], self.fans[1], self.fans[0], self.fans[1], self.fans[0]]:
+            deliver('like', fan.pk, self.video.pk)
+        notification = Notification.objects.get(recipient=self.owner)
+        self.assertEqual((notification.actor_id, notification.actor_count), (self.fans[0].pk, 2))
+        self.assertEqual(notification.actors.count(), 2)
+        self.assertEqual(unread_count(self.owner), 1)
+
+    def test_latest_like_moves_the_notification_to_the_top(self):
+        deliver('like', self.fans[0].pk, self.video.pk)
+        like = Notification.objects.get(recipient=self.owner)
+        deliver('follow', self.fans[1].pk, self.owner.pk)
+        deliver('like', self.fans[2].pk, self.video.pk)
+        newest = Notification.objects.filter(recipient=self.owner).order_by('-created_at').first()
+        self.assertEqual(newest.pk, like.pk)
+
+    def test_read_notification_starts_a_new_one(self):
+        deliver('like', self.fans[0].pk, self.video.pk)
+        self.assertEqual(unread_count(self.owner), 1)
+        mark_read(self.owner)
+        self.assertEqual(self.cached_count(self.owner), 0)
+
+        deliver('like', self.fans[1].pk, self.video.pk)
+        self.assertEqual(Notification.objects.filter(recipient=self.owner).count(), 2)
+        self.assertEqual(Notification.objects.get(recipient=self.owner, is_read=False).actor_count, 1)
+        self.assertEqual(self.cached_count(self.owner), 1)
+
+    def test_likes_and_bookmarks_are_kept_apart(self):
+        deliver('like', self.fans[0].pk, self.video.pk)
+        channel = Channel.objects.filter(collection__user=self.fans[1]).first()
+        bookmark = Bookmark.objects.create(user=self.fans[1], channel=channel, video=self.video, title='', access='public')
+        deliver('bookmark', self.fans[1].pk, bookmark.pk)
+        types = sorted(Notification.objects.filter(recipient=self.owner).values_list('notification_type', flat=True))
+        self.assertEqual(types, ['video_bookmark', 'video_like'])
+
+    def test_muted_actor_is_not_coalesced_in(self):
+        deliver('like', self.fans[0].pk, self.video.pk)
+        MutedUser.objects.create(user=self.owner, muted_user=self.fans[1])
+        deliver('like', self.fans[1].pk, self.video.pk)
+        notification = Notification.objects.get(recipient=self.owner)
+        self.assertEqual((notification.actor_id, notification.actor_count), (self.fans[0].pk, 1))
+
+    def test_own_likes_are_not_notified(self):
+        deliver('like', self.owner.pk, self.video.pk)
+        self.assertFalse(Notification.objects.exists())
+
+    def test_private_bookmark_is_not_notified(self):
+        channel = Channel.objects.filter(collection__user=self.fans[0]).first()
+        bookmark = Bookmark.objects.create(user=self.fans[0], channel=channel, video=self.video, title='', access='private')
+        deliver('bookmark', self.fans[0].pk, bookmark.pk)
+        self.assertFalse(Notification.objects.exists())
+
+
+class UnreadCountTests(NotificationTestCase):
+    def test_count_is_cached_on_first_read(self):
+        deliver('follow', self.fans[0].pk, self.owner.pk)
+        self.assertIsNone(self.cached_count(self.owner))
+        self.assertEqual(unread_count(self.owner), 1)
+        self.assertEqual(self.cached_count(self.owner), 1)
+
+    def test_recount_does_not_overwrite_a_stored_count(self):
+        deliver('follow', self.fans[0].pk, self.owner.pk)
+
+        def compute():
+            # Another request stores (and moves) the count during this recount
+            cache.set(unread_count_key(self.owner.pk), 1)
+            adjust_unread_count(self.owner.pk, 1)
+            return 1
+
+        self.assertEqual(cached_unread_count(self.owner.pk, compute), 1)
+        self.assertEqual(self.cached_count(self.owner), 2)
+
+    def test_fan_out_drops_the_recipients_counts(self):
+        for fan in self.fans:
+            Follow.objects.create(follower=fan, followed=self.owner)
+            self.assertEqual(unread_count(fan), 0)
+        channel = Channel.objects.filter(collection__user=self.owner).first()
+        bookmark = Bookmark.objects.create(user=self.owner, channel=channel, video=self.video, title='', access='public')
+        deliver('bookmark', self.owner.pk, bookmark.pk)
+        for fan in self.fans:
+            self.assertIsNone(self.cached_count(fan))
+            self.assertEqual(unread_count(fan), 1)
+
+    def test_marking_read_moves_the_cached_count(self):
+        for fan in self.fans:
+            deliver('follow', fan.pk, self.owner.pk)
+        self.assertEqual(unread_count(self.owner), 3)
+        first, second, _ = Notification.objects.filter(recipient=self.owner).order_by('id')
+
+        self.assertEqual(mark_read(self.owner, [first.pk, second.pk, first.pk]), 2)
+        self.assertEqual(self.cached_count(self.owner), 1)
+        # Already read: nothing changes
+        self.assertEqual(mark_read(self.owner, [first.pk]), 0)
+        self.assertEqual(self.cached_count(self.owner), 1)
+
+        first.refresh_from_db()
+        first.mark_as_unread()
+        self.assertEqual(self.cached_count(self.owner), 2)
+        first.mark_as_read()
+        first.mark_as_read()
+        self.assertEqual(self.cached_count(self.owner), 1)
+        self.assertEqual(self.cached_count(self.owner), self.unread_rows(self.owner))
+
+    def test_other_users_notifications_are_not_marked(self):
+        deliver('follow', self.fans[0].pk, self.owner.pk)
+        deliver('follow', self.owner.pk, self.fans[0].pk)
+        theirs = Notification.objects.get(recipient=self.fans[0])
+        self.assertEqual(mark_read(self.owner, [theirs.pk]), 0)
+        self.assertEqual(self.unread_rows(self.fans[0]), 1)
+
+    def test_muting_marks_the_actors_notifications_read(self):
+        deliver('follow', self.fans[0].pk, self.owner.pk)
+        deliver('follow', self.fans[1].pk, self.owner.pk)
+        self.assertEqual(unread_count(self.owner), 2)
+        MutedUser.objects.create(user=self.owner, muted_user=self.fans[0])
+        self.assertEqual(self.cached_count(self.owner), 1)
+        self.assertEqual(self.unread_rows(self.owner), 1)
+
+    def test_adjusting_never_goes_below_zero_or_creates_a_count(self):
+        adjust_unread_count(self.owner.pk, 1)
+        self.assertIsNone(self.cached_count(self.owner))
+        self.assertEqual(unread_count(self.owner), 0)
+        adjust_unread_count(self.owner.pk, -5)
+        self.assertEqual(self.cached_count(self.owner), 0)
+
+    def test_api(self):
+        for fan in self.fans:
+            deliver('follow', fan.pk, self.owner.pk)
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        self.assertEqual(client.get('/api/notifications/unread-count/').data, {'unread_count': 3})
+        ids = list(Notification.objects.filter(recipient=self.owner).values_list('id', flat=True)[:2])
+        response = client.post('/api/notifications/mark-read/', {'ids': ids}, format='json')
+        self.assertEqual(response.data, {'marked_read': 2, 'unread_count': 1})
+        response = client.post('/api/notifications/mark-read/', {}, format='json')
+        self.assertEqual(response.data, {'marked_read': 1, 'unread_count': 0})
+
+
+class CollectionTreeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        cls.tag = Tag.objects.create(name='tag')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_library(self, collections, channels, bookmarks):
+        for i in range(collections):
+            collection = Collection.objects.create(user=self.user, name=f'c{Collection.objects.count()}')
+            for j in range(channels):
+                channel = Channel.objects.create(collection=collection, name=f'ch{j}')
+                for _ in range(bookmarks):
+                    video = Video.objects.create(source_url=f'https://example.com/{Video.objects.count()}', title='')
+                    bookmark = Bookmark.objects.create(user=self.user, channel=channel, video=video, title='', access='public')
+                    bookmark.tags.add(self.tag)
+
+    def query_counts(self):
+        urls = [
+            '/api/collections/',
+            '/api/collections/tree/',
+            f'/api/collections/{Collection.objects.filter(user=self.user).latest("pk").pk}/channels/',
+            '/api/profile/owner/',
+        ]
+        counts = []
+        for url in urls:
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            counts.append(len(queries))
+        return counts
+
+    def test_query_count_does_not_grow_with_the_library(self):
+        self.add_library(collections=1, channels=1, bookmarks=1)
+        small = self.query_counts()
+        self.add_library(collections=3, channels=3, bookmarks=3)
+        self.assertEqual(self.query_counts(), small)
+
+    def test_nested_bookmarks_are_capped_and_flagged(self):
+        self.add_library(collections=1, channels=1, bookmarks=NESTED_BOOKMARKS_PER_CHANNEL + 1)
+        channels = {
+            channel['name']: channel
+            for collection in self.client.get('/api/collections/').data
+            for channel in collection['channels']
+        }
+        full = channels['ch0']
+        self.assertEqual(full['bookmarks_count'], NESTED_BOOKMARKS_PER_CHANNEL + 1)
+        self.assertEqual(len(full['bookmarks']), NESTED_BOOKMARKS_PER_CHANNEL)
+        self.assertTrue(full['bookmarks_truncated'])
+        newest = Bookmark.objects.filter(channel__name='ch0').order_by('-created_at', '-id').first()
+        self.assertEqual(full['bookmarks'][0]['id'], newest.pk)
+
+        default = channels["owner's channel"]
+        self.assertEqual((default['bookmarks_count'], default['bookmarks'], default['bookmarks_truncated']), (0, [], False))
+
+        tree = self.client.get('/api/collections/tree/').data
+        self.assertNotIn('bookmarks', tree[0]['channels'][0])
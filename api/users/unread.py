@@ -0,0 +1,59 @@
+"""
+The cached unread-notification count behind the inbox badge.
+
+Each user's count lives in the cache under `unread_count_key` for
+UNREAD_COUNT_TIMEOUT seconds, so a badge poll is one key lookup. The
+count is moved by whichever worker wrote the notification, so this needs
+the shared Redis cache (REDIS_URL, see api/settings.py). It is
+computed from the (recipient, is_read, -created_at) index on a miss and
+then moved in place:
+
+* a single new notification increments it, a batch of them (a fan-out)
+  drops the keys of the batch's recipients in one call;
+* marking notifications read decrements it by the number of rows the
+  UPDATE changed; marking one unread increments it.
+
+A count that is not cached is simply left alone; the next read computes
+it. A recount is stored with `cache.add`, so it never overwrites a count
+another request stored (and may have moved) meanwhile. A change that
+lands between a recount's query and its store is still lost, and the
+short timeout bounds how long the badge can be off by it.
+
+This module does not import the models, so that `Notification` itself
+can use it.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+UNREAD_COUNT_TIMEOUT = getattr(settings, 'UNREAD_COUNT_TIMEOUT', 60 * 5)
+
+
+def unread_count_key(user_id):
+    return f"notifications-unread:{user_id}"
+
+
+def cached_unread_count(user_id, compute):
+    """Returns the cached count, storing `compute()` on a miss unless a count was stored meanwhile."""
+    key = unread_count_key(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = compute()
+        cache.add(key, count, UNREAD_COUNT_TIMEOUT)
+    return count
+
+
+def adjust_unread_count(user_id, delta):
+    """Moves a cached count by `delta`. Never goes below zero."""
+    if not delta:
+        return
+    key = unread_count_key(user_id)
+    try:
+        if cache.incr(key, delta) < 0:
+            cache.set(key, 0, UNREAD_COUNT_TIMEOUT)
+    except ValueError:
+        # Not cached; computed on the next read
+        pass
+
+
+def invalidate_unread_counts(user_ids):
+    cache.delete_many([unread_count_key(user_id) for user_id in user_ids])
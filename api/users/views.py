@@ -4,12 +4,23 @@ from users.models import Profile, Bookmark
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.views import APIView
-from rest_framework.permissions import IsAuthenticated
-
-from users.serializers import UserProfileDetailSerializer, BookmarkSerializer, UserProfileSerializer
+from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.authentication import BaseAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from adrf.views import APIView as AsyncAPIView
+from django.http import StreamingHttpResponse
+
+from users.serializers import (
+    UserProfileDetailSerializer, BookmarkSerializer, UserProfileSerializer, NotificationSerializer,
+    MarkNotificationsReadSerializer,
+)
 from .models import Collection, Channel, Follow, User
-from .serializers import CollectionSerializer, ChannelSerializer
+from .serializers import CollectionSerializer, ChannelSerializer, CollectionTreeSerializer
+from .collections import channel_bookmarks, collection_tree, nested_channels, nested_collections
+from .inbox import inbox, mark_read, unread_count
+from .stream import STREAM_MAX_VIDEOS, STREAM_TOKEN_MAX_AGE, event_stream, issue_stream_token, stream_token_user_id
 from operations.models import Video
+from operations.pagination import KeysetPagination
 
 class UserProfileView(generics.RetrieveAPIView):
     queryset = Profile.objects.select_related('user')
@@ -18,7 +29,9 @@ class UserProfileView(generics.RetrieveAPIView):
 
     def get_object(self):
         username = self.kwargs.get('username')
-        profile = get_object_or_404(Profile, user__username=username)
+        profile = get_object_or_404(
+            Profile.objects.select_related('user', 'user__stats'), user__username=username
+        )
         # Optionally, add privacy logic here
         return profile
 
@@ -31,10 +44,19 @@ class MyCollectionsListView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        collections = Collection.objects.filter(user=request.user)
+        collections = nested_collections(Collection.objects.filter(user=request.user))
         serializer = CollectionSerializer(collections, many=True)
         return Response(serializer.data)
 
+class MyCollectionsTreeView(APIView):
+    """Collections and channels with bookmark counts, without the bookmarks themselves."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        collections = collection_tree(Collection.objects.filter(user=request.user))
+        serializer = CollectionTreeSerializer(collections, many=True)
+        return Response(serializer.data)
+
 class CollectionChannelsListView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -44,10 +66,25 @@ class CollectionChannelsListView(APIView):
             collection = Collection.objects.get(id=collection_id, user=request.user)
         except Collection.DoesNotExist:
             return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
-        channels = collection.channels.all()
+        channels = nested_channels().filter(collection=collection)
         serializer = ChannelSerializer(channels, many=True)
         return Response(serializer.data)
 
+class ChannelBookmarksListView(generics.ListAPIView):
+    """
+    Paginated bookmarks of one channel, newest first. Owners see every
+    bookmark; everyone else only sees public ones.
+    """
+    serializer_class = BookmarkSerializer
+    permission_classes = [AllowAny]
+
+    def get_queryset(self):
+        channel = get_object_or_404(Channel.objects.select_related('collection'), pk=self.kwargs['channel_id'])
+        queryset = channel_bookmarks(channel.pk)
+        if channel.collection.user_id != self.request.user.id:
+            queryset = queryset.filter(access='public')
+        return queryset
+
 class BookmarkCreateAPIView(generics.CreateAPIView):
     queryset = Bookmark.objects.all()
     serializer_class = BookmarkSerializer
@@ -96,3 +133,69 @@ class ToggleFollowView(APIView):
             return Response({"is_followed": is_followed})
         except User.DoesNotExist:
             return Response({"error": "User not found."}, status=404)
+
+class NotificationListView(generics.ListAPIView):
+    """The user's notifications, newest first; `?unread=true` for unread ones only."""
+    serializer_class = NotificationSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        return inbox(self.request.user, unread_only=self.request.query_params.get('unread') == 'true')
+
+class NotificationMarkReadView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = MarkNotificationsReadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        updated = mark_read(request.user, serializer.validated_data.get('ids'))
+        return Response({"marked_read": updated, "unread_count": unread_count(request.user)})
+
+class UnreadNotificationCountView(APIView):
+    """The badge count, served from the cache (see users.unread)."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response({"unread_count": unread_count(request.user)})
+
+class StreamTokenAuthentication(BaseAuthentication):
+    """Authenticates `?token=` stream tokens, see users.stream."""
+    def authenticate(self, request):
+        token = request.query_params.get('token')
+        if not token:
+            return None
+        user_id = stream_token_user_id(token)
+        user = User.objects.filter(pk=user_id, is_active=True).first() if user_id else None
+        if user is None:
+            raise AuthenticationFailed("Invalid or expired stream token.")
+        return user, None
+
+class EventStreamTokenView(APIView):
+    """Issues the short-lived token that opens an event stream."""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        return Response({"token": issue_stream_token(request.user), "expires_in": STREAM_TOKEN_MAX_AGE})
+
+class EventStreamView(AsyncAPIView):
+    """
+    Server-Sent Events: new notifications, the unread count and the like
+    counts of `?videos=1,2,3`, see users.stream.
+    """
+    authentication_classes = [StreamTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    async def get(self, request):
+        try:
+            video_ids = [int(v) for v in request.query_params.get('videos', '').split(',') if v][:STREAM_MAX_VIDEOS]
+        except ValueError:
+            return Response({"error": "videos must be a comma-separated list of ids."}, status=400)
+        response = StreamingHttpResponse(
+            event_stream(request.user, video_ids, request.headers.get('Last-Event-ID')),
+            content_type='text/event-stream',
+        )
+        response['Cache-Control'] = 'no-cache'
+        # Tell nginx not to buffer the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class VideosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'videos'
+
+    def ready(self):
+        # Load the NLP models now instead of in the first scrape request.
+        if getattr(settings, 'TAG_GENERATOR_WARM_UP', False):
+            from .tagging import get_tag_generator
+            get_tag_generator().load()
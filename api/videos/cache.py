@@ -0,0 +1,207 @@
+"""
+Result cache for scraped URL metadata.
+
+Entries are keyed by a normalized form of the URL: tracking parameters
+and fragments are dropped, the remaining query is sorted, and YouTube and
+Vimeo links collapse to their video id, so every variant of a pasted link
+hits the same entry. Successful scrapes are kept for `TIMEOUT` seconds.
+Failures and partial scrapes are kept for `FAILURE_TIMEOUT` seconds, so a
+broken or slow page is not hammered but recovers quickly.
+
+The backend is configured with the `SCRAPER_CACHE` setting:
+
+    SCRAPER_CACHE = {
+        'BACKEND': 'videos.cache.DjangoMetadataCache',  # or LocMemMetadataCache
+        'OPTIONS': {'alias': 'default'},
+        'TIMEOUT': 86400,
+        'FAILURE_TIMEOUT': 300,
+    }
+
+`DjangoMetadataCache` stores entries in one of the project's CACHES. With
+REDIS_URL set (see api/settings.py) that is Redis, shared by every
+worker; otherwise it is a per-process memory cache.
+`LocMemMetadataCache` is a bounded in-process LRU meant for tests and
+single-process development.
+"""
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from operations.models import Video
+from users.models import Bookmark
+
+TRACKING_PARAMS = {
+    'fbclid', 'gclid', 'dclid', 'msclkid', 'yclid', 'igshid', 'mc_cid', 'mc_eid',
+    'ref', 'ref_src', 'ref_url', 'si', 'feature', 'spm', '_ga', '_gl',
+}
+TRACKING_PREFIXES = ('utm_',)
+
+_YOUTUBE_HOSTS = {'youtube.com', 'm.youtube.com', 'music.youtube.com', 'youtube-nocookie.com'}
+_YOUTUBE_PATH_RE = re.compile(r'^/(?:embed|shorts|live|v)/([\w-]{6,})')
+_VIMEO_PATH_RE = re.compile(r'^/(?:video/)?(\d+)(?:/|$)')
+
+
+def _host(netloc):
+    host = netloc.lower().rsplit('@', 1)[-1].split(':', 1)[0]
+    return host[4:] if host.startswith('www.') else host
+
+
+def normalize_url(url):
+    """Returns the canonical cache identity of `url`."""
+    parts = urlsplit(url.strip())
+    host = _host(parts.netloc)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+
+    if host in _YOUTUBE_HOSTS or host == 'youtu.be':
+        video_id = None
+        if host == 'youtu.be':
+            video_id = parts.path.strip('/').split('/')[0] or None
+        elif parts.path == '/watch':
+            video_id = dict(query).get('v')
+        else:
+            match = _YOUTUBE_PATH_RE.match(parts.path)
+            video_id = match.group(1) if match else None
+        if video_id:
+            return f'youtube:{video_id}'
+
+    if host in ('vimeo.com', 'player.vimeo.com'):
+        match = _VIMEO_PATH_RE.match(parts.path)
+        if match:
+            return f'vimeo:{match.group(1)}'
+
+    query = sorted(
+        (key, value) for key, value in query
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)
+    )
+    path = parts.path.rstrip('/') or '/'
+    netloc = parts.netloc.lower()
+    return urlunsplit((parts.scheme.lower() or 'http', netloc, path, urlencode(query), ''))
+
+
+class LocMemMetadataCache:
+    """Bounded in-process LRU with per-entry expiry."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class DjangoMetadataCache:
+    """Stores entries in one of the project's CACHES."""
+
+    def __init__(self, alias='default', key_prefix='scrape:'):
+        self.alias = alias
+        self.key_prefix = key_prefix
+
+    def _key(self, key):
+        # Hash so arbitrary URLs are valid keys for every cache backend.
+        return self.key_prefix + hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        return caches[self.alias].get(self._key(key))
+
+    def set(self, key, value, timeout):
+        caches[self.alias].set(self._key(key), value, timeout)
+
+    def clear(self):
+        caches[self.alias].clear()
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def _config():
+    return getattr(settings, 'SCRAPER_CACHE', {})
+
+
+def get_metadata_cache():
+    """Returns the configured cache backend, built once per process."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                config = _config()
+                backend_class = import_string(config.get('BACKEND', 'videos.cache.DjangoMetadataCache'))
+                _backend = backend_class(**config.get('OPTIONS', {}))
+    return _backend
+
+
+def _known_video_payload(url, user=None):
+    """
+    Builds the payload for a URL that already belongs to a Video, if any.
+    The description comes from the earliest bookmark `user` may read: a
+    public one, or their own.
+    """
+    video = Video.objects.filter(source_url=url).prefetch_related('tags').first()
+    if video is None:
+        return None
+    readable = Q(access='public')
+    if user is not None and user.is_authenticated:
+        readable |= Q(user=user)
+    description = Bookmark.objects.filter(readable, video=video).order_by('id').values_list(
+        'description', flat=True
+    ).first()
+    return {
+        'title': video.title,
+        'description': description or '',
+        'thumbnail_url': video.thumbnail_url or '',
+        'embed_url': video.embed_url or '',
+        'embed_url_options': [video.embed_url] if video.embed_url else [],
+        'partial': False,
+        'tags': [tag.name for tag in video.tags.all()],
+    }
+
+
+def get_cached_metadata(url, user=None):
+    """
+    Returns the cached payload for `url`, a `{'error': ...}` dict for a
+    recently failed URL, or None on a miss. Known videos are answered from
+    the database, as seen by `user`, without touching the cache.
+    """
+    payload = _known_video_payload(url, user)
+    if payload is not None:
+        return payload
+    return get_metadata_cache().get(normalize_url(url))
+
+
+def cache_metadata(url, payload):
+    config = _config()
+    timeout = config.get('FAILURE_TIMEOUT', 300) if payload.get('partial') else config.get('TIMEOUT', 86400)
+    get_metadata_cache().set(normalize_url(url), payload, timeout)
+
+
+def cache_failure(url, error):
+    get_metadata_cache().set(normalize_url(url), {'error': error}, _config().get('FAILURE_TIMEOUT', 300))
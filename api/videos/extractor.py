@@ -0,0 +1,156 @@
+"""
+Single-pass HTML extraction for the scraper.
+
+`PageExtractor` is fed the raw response body chunk by chunk as it arrives
+and collects, in one pass, everything the scraper reads from a page: the
+og: meta tags, iframe srcs, video/source srcs and the text of every
+script. It reproduces what the former BeautifulSoup(html.parser) walk
+found. Nesting follows BeautifulSoup's rules, where an end tag closes
+everything opened after its matching start tag. Charset detection also
+follows BeautifulSoup's order: byte order mark, then the document's own
+declaration, then UTF-8.
+
+The extractor reports `finished` once `</html>` has been seen, so the
+caller can stop downloading there.
+"""
+import codecs
+import re
+from html.parser import HTMLParser
+
+# Elements html.parser-based BeautifulSoup treats as void (never pushed on the stack).
+VOID_ELEMENTS = frozenset({
+    'area', 'base', 'basefont', 'bgsound', 'br', 'col', 'command', 'embed', 'frame',
+    'hr', 'image', 'img', 'input', 'isindex', 'keygen', 'link', 'menuitem', 'meta',
+    'nextid', 'param', 'source', 'spacer', 'track', 'wbr',
+})
+META_PROPERTIES = frozenset({'og:title', 'og:description', 'og:image', 'og:video:url', 'og:video'})
+
+SNIFF_BYTES = 2048
+_BOMS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+_DECLARED_CHARSET_RE = re.compile(rb'<\s*meta[^>]+charset\s*=\s*["\']?([a-zA-Z0-9_:.-]+)', re.I)
+
+
+def sniff_encoding(head):
+    """Picks the codec for a document from its first SNIFF_BYTES bytes."""
+    for bom, encoding in _BOMS:
+        if head.startswith(bom):
+            return encoding
+    match = _DECLARED_CHARSET_RE.search(head, 0, SNIFF_BYTES)
+    if match:
+        try:
+            return codecs.lookup(match.group(1).decode('ascii')).name
+        except LookupError:
+            pass
+    return 'utf-8'
+
+
+class PageExtractor(HTMLParser):
+    """
+    Incremental extractor; call `feed_bytes()` per chunk and `finish()` at
+    the end of the body. `script_handler(text)` is called with the text of
+    each non-empty script as soon as the script closes.
+    """
+
+    def __init__(self, script_handler=None):
+        super().__init__(convert_charrefs=True)
+        self.script_handler = script_handler
+        self.meta = {}
+        self.iframe_srcs = []
+        self.video_srcs = []
+        self.finished = False
+        self._stack = []
+        self._video_depth = 0
+        self._script = None
+        self._head = b''
+        self._decoder = None
+
+    # --- Byte input ---
+
+    def feed_bytes(self, chunk):
+        if self._decoder is None:
+            self._head += chunk
+            if len(self._head) < SNIFF_BYTES:
+                return
+            chunk, self._head = self._head, b''
+            self._decoder = codecs.getincrementaldecoder(sniff_encoding(chunk))(errors='replace')
+        self.feed(self._decoder.decode(chunk))
+
+    def finish(self):
+        if self._decoder is None:
+            head, self._head = self._head, b''
+            self._decoder = codecs.getincrementaldecoder(sniff_encoding(head))(errors='replace')
+            self.feed(self._decoder.decode(head))
+        self.feed(self._decoder.decode(b'', final=True))
+        self.close()
+        self._end_script()
+
+    # --- HTMLParser callbacks ---
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'meta':
+            prop = attrs.get('property')
+            if prop in META_PROPERTIES and prop not in self.meta:
+                self.meta[prop] = attrs.get('content')
+        elif tag == 'iframe':
+            src = attrs.get('src') or ''
+            if 'player' in src.lower() or 'embed' in src.lower():
+                self.iframe_srcs.append(src)
+        elif tag == 'video':
+            if attrs.get('src'):
+                self.video_srcs.append(attrs['src'])
+        elif tag == 'source':
+            if self._video_depth and attrs.get('src'):
+                self.video_srcs.append(attrs['src'])
+        elif tag == 'script':
+            self._end_script()
+            self._script = []
+
+        if tag not in VOID_ELEMENTS:
+            self._stack.append(tag)
+            if tag == 'video':
+                self._video_depth += 1
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag == 'html':
+            self.finished = True
+        if tag not in self._stack:
+            return
+        while self._stack:
+            closed = self._stack.pop()
+            if closed == 'video':
+                self._video_depth -= 1
+            elif closed == 'script':
+                self._end_script()
+            if closed == tag:
+                break
+
+    def handle_data(self, data):
+        if self._script is not None:
+            self._script.append(data)
+
+    def _end_script(self):
+        if self._script is None:
+            return
+        text, self._script = ''.join(self._script), None
+        if text and self.script_handler is not None:
+            self.script_handler(text)
+
+    # --- Results ---
+
+    def meta_content(self, *properties):
+        """Content of the first tag with the first of `properties` present."""
+        for prop in properties:
+            if prop in self.meta:
+                return self.meta[prop] or ''
+        return ''
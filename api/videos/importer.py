@@ -0,0 +1,444 @@
+"""
+Bulk bookmark imports.
+
+An import takes a JSON list, a CSV file or a browser bookmarks export
+(the Netscape HTML format) and bookmarks every URL in it into one
+channel. The URLs are handled in chunks of IMPORT_CHUNK_SIZE:
+
+1. Items whose URL is not http(s), or whose URL or tags are longer than
+   their columns allow, are reported as failed before anything is
+   written. URLs repeated within the batch (compared with
+   `normalize_url`) are reported as duplicates, and URLs that already
+   belong to a Video reuse it, looked up with one `source_url IN (...)`
+   query per chunk.
+2. Metadata for the remaining URLs comes from the scrape cache, or is
+   scraped concurrently, at most IMPORT_CONCURRENCY pages at a time
+   (on top of the scraper's own per-host cap).
+3. Videos, their tags and the bookmarks are written with `bulk_create`
+   in one transaction per chunk. Tag names are resolved in bulk through
+   operations.tags.
+
+`bulk_create` does not send signals, so each chunk refreshes the feed
+entries, search vectors and popularity counters of its videos, queues
+one timeline fan-out for its public bookmarks (operations.timeline), and
+the user's profile stats are recounted at the end. Imported bookmarks
+send no notifications, on purpose: followers would get one per URL of
+a file of thousands. The imported bookmarks reach them through their
+timelines.
+
+Per-item results and counters are saved on the BookmarkImportJob after
+every chunk, so a job can be polled while it runs. They also make a job
+resumable: the thread task backend loses jobs when the web process
+exits, and `manage.py resume_imports` (see `claim_stale_imports`) runs
+such jobs again, skipping every item that already has a result.
+"""
+import asyncio
+import csv
+import io
+import json
+from datetime import timedelta
+from html.parser import HTMLParser
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from api.tasks import enqueue
+from operations.bookmarkers import invalidate_bookmarkers_count
+from operations.feed import refresh_feed_entries
+from operations.models import Video, normalize_tag_name
+from operations.popularity import refresh_popularity
+from operations.search import refresh_search_vectors
+from operations.tags import resolve_tags, tag_ids
+from operations.timeline import fan_out_bookmarks
+from users.models import Bookmark
+from users.stats import refresh_profile_stats
+from .cache import cache_failure, cache_metadata, get_metadata_cache, normalize_url
+from .models import BookmarkImportJob
+from .scraper import get_client, scrape_metadata
+from .tagging import get_tag_generator
+
+IMPORT_MAX_ITEMS = getattr(settings, 'BOOKMARK_IMPORT_MAX_ITEMS', 5000)
+IMPORT_CHUNK_SIZE = getattr(settings, 'BOOKMARK_IMPORT_CHUNK_SIZE', 100)
+IMPORT_CONCURRENCY = getattr(settings, 'BOOKMARK_IMPORT_CONCURRENCY', 8)
+# Seconds without progress after which a pending or running job is presumed lost
+IMPORT_STALE_AFTER = getattr(settings, 'BOOKMARK_IMPORT_STALE_AFTER', 60 * 10)
+FORMATS = ('json', 'csv', 'html')
+
+# Column limits of Video, Bookmark and Tag
+URL_MAX_LENGTH = 2083
+TITLE_MAX_LENGTH = 300
+MEDIA_URL_MAX_LENGTH = 500
+TAG_MAX_LENGTH = 50
+MEDIA_FILE_MARKERS = ('.mp4', '.webm', '.m3u8')
+
+
+class ImportParseError(ValueError):
+    """Raised when an import file cannot be read."""
+
+
+# --- Parsing ---
+
+def _item(url, title='', description='', tags=()):
+    if isinstance(tags, str):
+        tags = tags.replace(';', ',').split(',')
+    return {
+        'url': str(url or '').strip(),
+        'title': str(title or '').strip(),
+        'description': str(description or '').strip(),
+        'tags': [str(tag).strip() for tag in tags or () if str(tag).strip()],
+    }
+
+
+def _item_error(item):
+    """Why `item` cannot be imported, or None. Checked before anything is written."""
+    url = item['url']
+    if not url.startswith(('http://', 'https://')):
+        return 'Not an http(s) URL.'
+    if len(url) > URL_MAX_LENGTH:
+        return f'URL is longer than {URL_MAX_LENGTH} characters.'
+    for tag in item['tags']:
+        if not _fits_tag(tag):
+            return f'Tag "{tag[:TAG_MAX_LENGTH]}..." is longer than {TAG_MAX_LENGTH} characters.'
+    return None
+
+
+def _fits_tag(name):
+    return len(normalize_tag_name(name)) <= TAG_MAX_LENGTH
+
+
+def parse_json(text):
+    """A list of URLs or of {url, title, description, tags} objects, or {"items": [...]}."""
+    try:
+        data = json.loads(text)
+    except ValueError as e:
+        raise ImportParseError(f'Invalid JSON: {e}')
+    if isinstance(data, dict):
+        data = data.get('items')
+    if not isinstance(data, list):
+        raise ImportParseError('Expected a list of URLs or of objects with a "url" key.')
+    items = []
+    for entry in data:
+        if isinstance(entry, str):
+            items.append(_item(entry))
+        elif isinstance(entry, dict):
+            items.append(_item(
+                entry.get('url') or entry.get('source_url'), entry.get('title'),
+                entry.get('description'), entry.get('tags') or (),
+            ))
+        else:
+            raise ImportParseError('Expected a list of URLs or of objects with a "url" key.')
+    return items
+
+
+def parse_csv(text):
+    """A CSV with a `url` column (and optional title, description, tags), or one URL per line."""
+    rows = list(csv.reader(io.StringIO(text)))
+    if not rows:
+        return []
+    header = [column.strip().lower() for column in rows[0]]
+    if 'url' not in header:
+        return [_item(row[0]) for row in rows if row and row[0].strip()]
+    columns = {name: header.index(name) for name in ('url', 'title', 'description', 'tags') if name in header}
+
+    def cell(row, name):
+        index = columns.get(name)
+        return row[index] if index is not None and index < len(row) else ''
+
+    return [
+        _item(cell(row, 'url'), cell(row, 'title'), cell(row, 'description'), cell(row, 'tags'))
+        for row in rows[1:] if any(value.strip() for value in row)
+    ]
+
+
+class NetscapeBookmarkParser(HTMLParser):
+    """Reads `<A HREF=... TAGS=...>title</A>` entries and their `<DD>` descriptions."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.items = []
+        self._field = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'a':
+            attrs = dict(attrs)
+            if attrs.get('href'):
+                self.items.append(_item(attrs['href'], tags=attrs.get('tags') or ''))
+                self._field = 'title'
+                return
+        if tag == 'dd' and self.items:
+            self._field = 'description'
+        elif tag in ('dt', 'dl', 'h3'):
+            self._field = None
+
+    def handle_endtag(self, tag):
+        if tag == 'a':
+            self._field = None
+
+    def handle_data(self, data):
+        if self._field is not None:
+            item = self.items[-1]
+            item[self._field] = (item[self._field] + data).strip()
+
+
+def parse_netscape(text):
+    parser = NetscapeBookmarkParser()
+    parser.feed(text)
+    parser.close()
+    return parser.items
+
+
+def detect_format(text):
+    start = text.lstrip('\ufeff \t\r\n')[:1]
+    if start == '<':
+        return 'html'
+    if start and start in '[{':
+        return 'json'
+    return 'csv'
+
+
+def parse_import(text, format=None):
+    """Parses an import file into items. Raises ImportParseError."""
+    format = format or detect_format(text)
+    parsers = {'json': parse_json, 'csv': parse_csv, 'html': parse_netscape}
+    if format not in parsers:
+        raise ImportParseError(f'Unknown format {format!r}; expected one of {", ".join(FORMATS)}.')
+    items = parsers[format](text.lstrip('\ufeff'))
+    if not items:
+        raise ImportParseError('No URLs found.')
+    if len(items) > IMPORT_MAX_ITEMS:
+        raise ImportParseError(f'At most {IMPORT_MAX_ITEMS} URLs can be imported at once.')
+    return items
+
+
+# --- Running ---
+
+def create_import_job(user, channel, items, access='public', orientation=None):
+    return BookmarkImportJob.objects.create(
+        user=user, channel=channel, access=access, orientation=orientation,
+        items=items, total=len(items),
+    )
+
+
+def run_import_job(job_id):
+    """Task entry point, see api.tasks."""
+    job = BookmarkImportJob.objects.select_related('user', 'channel').get(pk=job_id)
+    if job.status == 'pending':
+        run_import(job)
+
+
+def claim_stale_imports(stale_after=IMPORT_STALE_AFTER):
+    """
+    Puts the jobs a lost worker left behind (pending or running, without
+    progress for `stale_after` seconds) back to pending, and returns
+    them for `run_import_job`. A job is claimed with a conditional UPDATE,
+    so two resumers never both take it.
+    """
+    cutoff = timezone.now() - timedelta(seconds=stale_after)
+    stale = BookmarkImportJob.objects.filter(status__in=('pending', 'running'), updated_at__lt=cutoff)
+    claimed = []
+    for job_id, updated_at in stale.order_by('created_at').values_list('pk', 'updated_at'):
+        if BookmarkImportJob.objects.filter(pk=job_id, updated_at=updated_at).update(
+            status='pending', updated_at=timezone.now()
+        ):
+            claimed.append(job_id)
+    return claimed
+
+
+async def _scrape_all(urls, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def scrape(url):
+        async with semaphore:
+            try:
+                return url, await scrape_metadata(url)
+            except Exception as e:
+                return url, {'error': str(e) or e.__class__.__name__}
+
+    try:
+        return dict(await asyncio.gather(*(scrape(url) for url in urls)))
+    finally:
+        # The client belongs to this short-lived event loop
+        await get_client().aclose()
+
+
+def fetch_metadata(urls, concurrency=IMPORT_CONCURRENCY):
+    """Returns {url: payload or {'error': ...}} from the scrape cache or by scraping."""
+    metadata_cache = get_metadata_cache()
+    found, missing = {}, []
+    for url in urls:
+        cached = metadata_cache.get(normalize_url(url))
+        if cached is not None:
+            found[url] = cached
+        else:
+            missing.append(url)
+    if missing:
+        scraped = asyncio.run(_scrape_all(missing, concurrency))
+        for url, payload in scraped.items():
+            if 'error' in payload:
+                cache_failure(url, payload['error'])
+            else:
+                cache_metadata(url, payload)
+        found.update(scraped)
+    return found
+
+
+def _media_url(url):
+    return url if url and len(url) <= MEDIA_URL_MAX_LENGTH else None
+
+
+def _new_video(job, item, metadata):
+    embed_url = _media_url(metadata.get('embed_url'))
+    is_media_file = embed_url and any(marker in embed_url for marker in MEDIA_FILE_MARKERS)
+    return Video(
+        source_url=item['url'],
+        title=(item['title'] or metadata.get('title') or item['url'])[:TITLE_MAX_LENGTH],
+        thumbnail_url=_media_url(metadata.get('thumbnail_url')),
+        embed_url=embed_url,
+        player_type='direct' if is_media_file or not embed_url else 'iframe',
+        orientation=job.orientation,
+        created_by=job.user,
+    )
+
+
+class Importer:
+    def __init__(self, job, concurrency=IMPORT_CONCURRENCY, chunk_size=IMPORT_CHUNK_SIZE):
+        self.job = job
+        self.concurrency = concurrency
+        self.chunk_size = chunk_size
+        # A resumed job keeps the results of the chunks it already wrote
+        saved = job.results if len(job.results) == len(job.items) else []
+        self.results = list(saved) or [None] * len(job.items)
+
+    def run(self):
+        job = self.job
+        seen = set()
+        pending = []
+        for index, item in enumerate(job.items):
+            url = item['url']
+            error = _item_error(item)
+            if error:
+                self.results[index] = {'url': url, 'status': 'failed', 'error': error}
+                continue
+            key = normalize_url(url)
+            if key in seen:
+                self.results[index] = {'url': url, 'status': 'duplicate'}
+                continue
+            seen.add(key)
+            if self.results[index] is None:
+                pending.append(index)
+
+        for start in range(0, len(pending), self.chunk_size):
+            self.import_chunk(pending[start:start + self.chunk_size])
+            self.save_progress()
+
+        refresh_profile_stats([job.user_id])
+
+    def import_chunk(self, indexes):
+        job = self.job
+        items = {index: job.items[index] for index in indexes}
+        urls = [item['url'] for item in items.values()]
+        known = dict(Video.objects.filter(source_url__in=urls).values_list('source_url', 'id'))
+        metadata = fetch_metadata([url for url in urls if url not in known], self.concurrency)
+
+        new_videos = {}
+        for index, item in items.items():
+            if item['url'] in known:
+                continue
+            payload = metadata[item['url']]
+            if 'error' in payload and not item['title']:
+                self.results[index] = {'url': item['url'], 'status': 'failed', 'error': payload['error']}
+                continue
+            new_videos[index] = _new_video(job, item, payload)
+
+        # Video tags: the item's own, else the scraped ones, else suggestions from the title
+        video_tags = {
+            index: items[index]['tags'] or metadata[items[index]['url']].get('tags') or []
+            for index in new_videos
+        }
+        untagged = [index for index, names in video_tags.items() if not names]
+        suggestions = get_tag_generator().generate_many(new_videos[index].title for index in untagged)
+        video_tags.update(zip(untagged, suggestions))
+        # Scraped and suggested names are not validated like the item's own
+        video_tags = {index: [name for name in names if _fits_tag(name)] for index, names in video_tags.items()}
+        resolved = resolve_tags([name for names in video_tags.values() for name in names]
+                                + [name for item in items.values() for name in item['tags']])
+
+        with transaction.atomic():
+            Video.objects.bulk_create(new_videos.values())
+            Video.tags.through.objects.bulk_create([
+                Video.tags.through(video_id=new_videos[index].pk, tag_id=tag_id)
+                for index, names in video_tags.items() for tag_id in tag_ids(names, resolved)
+            ], ignore_conflicts=True)
+
+            video_ids = {index: known[item['url']] for index, item in items.items() if item['url'] in known}
+            video_ids.update({index: video.pk for index, video in new_videos.items()})
+            already = set(Bookmark.objects.filter(
+                user=job.user, channel=job.channel, video_id__in=video_ids.values()
+            ).values_list('video_id', flat=True))
+
+            bookmarks = {}
+            for index, video_id in video_ids.items():
+                item = items[index]
+                if video_id in already:
+                    self.results[index] = {'url': item['url'], 'status': 'exists', 'video_id': video_id}
+                    continue
+                bookmarks[index] = Bookmark(
+                    user=job.user, channel=job.channel, video_id=video_id,
+                    title=(item['title'] or metadata.get(item['url'], {}).get('title') or '')[:TITLE_MAX_LENGTH],
+                    description=item['description'] or metadata.get(item['url'], {}).get('description') or '',
+                    access=job.access,
+                )
+            Bookmark.objects.bulk_create(bookmarks.values())
+            Bookmark.tags.through.objects.bulk_create([
+                Bookmark.tags.through(bookmark_id=bookmarks[index].pk, tag_id=tag_id)
+                for index in bookmarks for tag_id in tag_ids(items[index]['tags'], resolved)
+            ], ignore_conflicts=True)
+
+            changed = {bookmark.video_id for bookmark in bookmarks.values()}
+            refresh_feed_entries(changed)
+            refresh_search_vectors(changed)
+            refresh_popularity(changed)
+            transaction.on_commit(lambda: [invalidate_bookmarkers_count(video_id) for video_id in changed])
+            if job.access == 'public' and bookmarks:
+                enqueue(fan_out_bookmarks, [bookmark.pk for bookmark in bookmarks.values()])
+
+        for index, bookmark in bookmarks.items():
+            self.results[index] = {
+                'url': items[index]['url'],
+                'status': 'created' if index in new_videos else 'bookmarked',
+                'video_id': bookmark.video_id,
+                'bookmark_id': bookmark.pk,
+            }
+
+    def save_progress(self):
+        job = self.job
+        done = [result for result in self.results if result is not None]
+        job.results = self.results
+        job.processed = len(done)
+        job.created_count = sum(result['status'] in ('created', 'bookmarked') for result in done)
+        job.skipped_count = sum(result['status'] in ('duplicate', 'exists') for result in done)
+        job.failed_count = sum(result['status'] == 'failed' for result in done)
+        job.save(update_fields=['results', 'processed', 'created_count', 'skipped_count', 'failed_count', 'updated_at'])
+
+
+def run_import(job, concurrency=IMPORT_CONCURRENCY, chunk_size=IMPORT_CHUNK_SIZE):
+    """Runs an import job to completion and returns it."""
+    job.status = 'running'
+    # A resumed job keeps its original start
+    job.started_at = job.started_at or timezone.now()
+    job.save(update_fields=['status', 'started_at', 'updated_at'])
+    importer = Importer(job, concurrency, chunk_size)
+    try:
+        importer.run()
+    except Exception as e:
+        job.status = 'failed'
+        job.error = str(e) or e.__class__.__name__
+        raise
+    else:
+        job.status = 'done'
+    finally:
+        importer.save_progress()
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at', 'updated_at'])
+    return job
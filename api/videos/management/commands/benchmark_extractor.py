@@ -0,0 +1,65 @@
+import statistics
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from videos.extractor import PageExtractor
+from videos.player_config import PlayerConfigScanner
+from videos.scraper import extract_page
+
+
+class Command(BaseCommand):
+    help = (
+        "Times page extraction on captured HTML files (e.g. saved with `curl -o`). "
+        "Reports the full single-pass extraction and the player-config script scan separately."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+', help="Captured HTML pages.")
+        parser.add_argument('--repeat', type=int, default=20, help="Runs per file; the median is reported.")
+        parser.add_argument('--url', default='https://example.com/', help="Page URL passed to the extractor.")
+
+    def _median(self, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+        return statistics.median(timings)
+
+    def handle(self, *args, **options):
+        repeat = max(1, options['repeat'])
+        for name in options['files']:
+            path = Path(name)
+            if not path.is_file():
+                raise CommandError(f"No such file: {name}")
+            content = path.read_bytes()
+
+            # Collect script text once so the scan can be timed on its own.
+            scripts = []
+            collector = PageExtractor(script_handler=scripts.append)
+            collector.feed_bytes(content)
+            collector.finish()
+
+            def scan():
+                scanner = PlayerConfigScanner(max_seconds=float('inf'))
+                for text in scripts:
+                    scanner.scan(text)
+                return scanner
+
+            page_time = self._median(lambda: extract_page(content, options['url']), repeat)
+            scan_time = self._median(scan, repeat)
+            _, found_urls = extract_page(content, options['url'])
+            megabytes = len(content) / 1024 / 1024
+            script_megabytes = sum(len(text) for text in scripts) / 1024 / 1024
+
+            self.stdout.write(
+                f"{path.name}: {megabytes:.2f} MB, {len(scripts)} scripts ({script_megabytes:.2f} MB), "
+                f"{len(found_urls)} URLs found, {len(scan().found_urls)} from scripts"
+            )
+            self.stdout.write(
+                f"  page extraction {page_time * 1000:.1f} ms ({megabytes / page_time:.1f} MB/s), "
+                f"script scan {scan_time * 1000:.1f} ms"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Benchmarked {len(options['files'])} file(s), median of {repeat} runs."))
@@ -0,0 +1,57 @@
+import sys
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from operations.models import ORIENTATION_CHOICES
+from users.models import ACCESS_CHOICES, Channel
+from videos.importer import (
+    FORMATS, IMPORT_CHUNK_SIZE, IMPORT_CONCURRENCY, ImportParseError, create_import_job, parse_import, run_import,
+)
+
+
+class Command(BaseCommand):
+    help = "Bookmarks every URL in a JSON, CSV or bookmarks HTML file into a user's channel."
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('channel_id', type=int)
+        parser.add_argument('path', help="File to import, or - for stdin.")
+        parser.add_argument('--format', choices=FORMATS, help="Detected from the content when omitted.")
+        parser.add_argument('--access', choices=[value for value, _ in ACCESS_CHOICES], default='public')
+        parser.add_argument('--orientation', choices=[value for value, _ in ORIENTATION_CHOICES])
+        parser.add_argument('--concurrency', type=int, default=IMPORT_CONCURRENCY, help="Pages scraped at once.")
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE, help="URLs per transaction.")
+        parser.add_argument('--show-failures', type=int, default=20, help="Failed URLs to list individually.")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+            channel = Channel.objects.get(id=options['channel_id'], collection__user=user)
+        except (User.DoesNotExist, Channel.DoesNotExist):
+            raise CommandError("No such user, or the channel does not belong to them.")
+
+        if options['path'] == '-':
+            text = sys.stdin.read()
+        else:
+            with open(options['path'], encoding='utf-8-sig', errors='replace') as f:
+                text = f.read()
+        try:
+            items = parse_import(text, options['format'])
+        except ImportParseError as e:
+            raise CommandError(str(e))
+
+        job = create_import_job(user, channel, items, access=options['access'], orientation=options['orientation'])
+        self.stdout.write(f"Importing {job.total} URLs into '{channel.name}' (job {job.pk})...")
+        started = time.monotonic()
+        run_import(job, concurrency=options['concurrency'], chunk_size=options['chunk_size'])
+        elapsed = time.monotonic() - started
+
+        failures = [result for result in job.results if result['status'] == 'failed']
+        for result in failures[:options['show_failures']]:
+            self.stdout.write(f"  failed {result['url']}: {result['error']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {job.created_count} bookmarks, skipped {job.skipped_count}, failed {job.failed_count} "
+            f"in {elapsed:.1f}s ({job.processed / elapsed if elapsed else 0:.1f} items/s)."
+        ))
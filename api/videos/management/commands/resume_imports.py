@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from videos.importer import IMPORT_STALE_AFTER, claim_stale_imports, run_import_job
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs again the bookmark imports whose worker was lost (pending or running without progress), "
+        "skipping the items they already wrote. Run it after a restart, or periodically."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stale-after', type=int, default=IMPORT_STALE_AFTER,
+            help="Seconds without progress after which a job is presumed lost.",
+        )
+
+    def handle(self, *args, **options):
+        job_ids = claim_stale_imports(options['stale_after'])
+        for job_id in job_ids:
+            self.stdout.write(f"Resuming import job {job_id}...")
+            try:
+                run_import_job(job_id)
+            except Exception as e:
+                # run_import has marked the job failed; carry on with the others
+                self.stderr.write(f"  job {job_id} failed: {e}")
+        self.stdout.write(self.style.SUCCESS(f"Resumed {len(job_ids)} import jobs."))
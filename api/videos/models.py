@@ -1,3 +1,54 @@
 from django.db import models
+from django.conf import settings
+from django.utils import timezone
 
 # Create your models here.
+
+IMPORT_STATUS_CHOICES = [
+    ('pending', 'Pending'),
+    ('running', 'Running'),
+    ('done', 'Done'),
+    ('failed', 'Failed'),
+]
+
+class BookmarkImportJob(models.Model):
+    """
+    A batch of URLs being bookmarked into one channel, see videos.importer.
+
+    `items` holds the parsed input and `results` one entry per item, in
+    input order, as they are written. The counters are updated after
+    every chunk so the job can be polled while it runs, and `updated_at`
+    tells a live job from one whose worker died (see
+    videos.importer.claim_stale_imports).
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='bookmark_imports')
+    channel = models.ForeignKey('users.Channel', on_delete=models.CASCADE, related_name='imports')
+    access = models.CharField(max_length=10, default='public')
+    orientation = models.CharField(max_length=10, blank=True, null=True)
+    status = models.CharField(max_length=10, choices=IMPORT_STATUS_CHOICES, default='pending')
+    items = models.JSONField(default=list, help_text="Parsed input: url, title, description and tags per item")
+    results = models.JSONField(default=list, help_text="Per-item outcome, in input order")
+    total = models.PositiveIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    created_count = models.PositiveIntegerField(default=0, help_text="Bookmarks created")
+    skipped_count = models.PositiveIntegerField(default=0, help_text="Duplicates and already bookmarked URLs")
+    failed_count = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['status', 'updated_at'], name='import_status_upd_idx')]
+
+    def __str__(self):
+        return f"Import of {self.total} URLs into '{self.channel.name}' ({self.status})"
+
+    @property
+    def items_per_second(self):
+        if self.started_at is None or not self.processed:
+            return None
+        elapsed = ((self.finished_at or timezone.now()) - self.started_at).total_seconds()
+        return round(self.processed / elapsed, 2) if elapsed > 0 else None
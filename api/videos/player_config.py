@@ -0,0 +1,157 @@
+"""
+Media URL extraction from inline player configuration.
+
+Player pages configure their video in script objects such as
+`jwplayer().setup({file: "https://cdn/x.m3u8"})` or
+`var cfg = {"sources": {"hls": "https:\\/\\/cdn\\/x.m3u8"}}`.
+`PlayerConfigScanner` tokenizes script text once, left to right. It
+skips string literals, template literals, comments and regex literals as
+whole tokens, and it tracks `{`/`[` nesting. Every `key: "value"` pair
+inside an object literal whose key is one of MEDIA_KEYS and whose value
+mentions .m3u8 or .mp4 is collected, at any depth. A cheap prefilter
+finds the last place such a pair could occur. Scripts without one are
+skipped, and tokenizing stops after the last one.
+
+Each scanner has a character budget and a time budget shared by all the
+scripts of one page, so a huge inline bundle costs at most a bounded
+amount of work. When either budget runs out, `exhausted` is set and
+further scripts are ignored.
+"""
+import re
+import time
+
+from django.conf import settings
+
+MEDIA_KEYS = frozenset({'hls', 'video_url', 'file', 'src'})
+MEDIA_MARKERS = ('.m3u8', '.mp4')
+
+MAX_SCRIPT_CHARS = getattr(settings, 'SCRAPER_MAX_SCRIPT_CHARS', 4 * 1024 * 1024)
+MAX_SCRIPT_SECONDS = getattr(settings, 'SCRAPER_MAX_SCRIPT_SECONDS', 1.0)
+
+_STRING = r'''"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*\''''
+# Identifiers, numbers and operators are skipped inside the regex engine;
+# only the tokens that matter become Python-level matches.
+_TOKEN_RE = re.compile(r'''
+    (?P<str>STRING)
+  | (?P<colon>:\s*)
+  | (?P<tpl>`(?:[^`\\]|\\.)*`)
+  | (?P<comment>//[^\n]*|/\*.*?(?:\*/|\Z))
+  | (?P<open>[{\[])
+  | (?P<close>[}\]])
+  | (?P<slash>/)
+'''.replace('STRING', _STRING), re.S | re.X)
+_REGEX_LITERAL_RE = re.compile(r'(?:[^/\\\[\n]|\\.|\[(?:[^\]\\\n]|\\.)*\])+/[a-z]*')
+_CANDIDATE_RE = re.compile(
+    r'''(?<![\w$])["']?(?:hls|video_url|file|src)["']?\s*:\s*["'`][^"'`\n]*?\.(?:m3u8|mp4)'''
+)
+_BLANK_RE = re.compile(r'\s*')
+_IDENT_BEFORE_RE = re.compile(r'(?<![\w$])([A-Za-z_$][\w$]*)\s*$')
+_KEYWORD_BEFORE_RE = re.compile(r'(?<![\w$])(?:return|typeof|case|in|of|void|delete)$')
+_ESCAPE_RE = re.compile(r'\\(u[0-9a-fA-F]{4}|x[0-9a-fA-F]{2}|.)', re.S)
+_SIMPLE_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', 'b': '\b', 'f': '\f', 'v': '\v', '0': '\0'}
+
+# Check the clock every this many tokens.
+_CLOCK_INTERVAL = 4096
+
+
+def _unescape(body):
+    if '\\' not in body:
+        return body
+
+    def replace(match):
+        escape = match.group(1)
+        if escape[0] in 'ux' and len(escape) > 1:
+            return chr(int(escape[1:], 16))
+        return _SIMPLE_ESCAPES.get(escape, escape)
+
+    return _ESCAPE_RE.sub(replace, body)
+
+
+def _starts_regex(text, pos):
+    """Whether the `/` at `pos` opens a regex literal rather than dividing."""
+    i = pos - 1
+    while i >= 0 and text[i] in ' \t\r\n':
+        i -= 1
+    if i < 0:
+        return True
+    char = text[i]
+    if char.isalnum() or char in '_$':
+        return _KEYWORD_BEFORE_RE.search(text, max(0, i - 7), i + 1) is not None
+    return char not in ')]}"\'`'
+
+
+class PlayerConfigScanner:
+    """Collects media URLs from the scripts of one page into `found_urls`."""
+
+    def __init__(self, max_chars=MAX_SCRIPT_CHARS, max_seconds=MAX_SCRIPT_SECONDS):
+        self.found_urls = set()
+        self.chars_left = max_chars
+        self.max_seconds = max_seconds
+        self.deadline = None
+        self.exhausted = False
+
+    def scan(self, text):
+        if self.exhausted:
+            return
+        if self.deadline is None:
+            self.deadline = time.monotonic() + self.max_seconds
+        if len(text) > self.chars_left:
+            text = text[:self.chars_left]
+            self.exhausted = True
+        self.chars_left -= len(text)
+        if not any(marker in text for marker in MEDIA_MARKERS):
+            return
+        stop = None
+        for candidate in _CANDIDATE_RE.finditer(text):
+            stop = candidate.end()
+        if stop is not None and not self._scan(text, stop):
+            self.exhausted = True
+
+    def _scan(self, text, stop):
+        """Tokenizes `text` up to `stop`; returns False if the time budget ran out."""
+        stack = []
+        key = None         # last object key; applies to a value starting at key_end
+        key_end = -1
+        last_string = None
+        last_string_end = -1
+        pos = 0
+        tokens = 0
+        search = _TOKEN_RE.search
+        while True:
+            match = search(text, pos)
+            if match is None or match.start() >= stop:
+                return True
+            pos = match.end()
+            tokens += 1
+            if tokens % _CLOCK_INTERVAL == 0 and time.monotonic() > self.deadline:
+                return False
+
+            kind = match.lastgroup
+            if kind == 'str' or kind == 'tpl':
+                if match.start() != key_end or key not in MEDIA_KEYS or not stack or stack[-1] != '{':
+                    last_string, last_string_end = match.group(), pos
+                    continue
+                value = match.group()[1:-1]
+                if kind == 'tpl' and '${' in value:
+                    continue
+                value = _unescape(value)
+                if any(marker in value for marker in MEDIA_MARKERS):
+                    self.found_urls.add(value)
+            elif kind == 'colon':
+                # The key is the string or identifier right before the colon.
+                start = match.start()
+                if last_string is not None and _BLANK_RE.fullmatch(text, last_string_end, start):
+                    key = _unescape(last_string[1:-1])
+                else:
+                    ident = _IDENT_BEFORE_RE.search(text, max(0, start - 64), start)
+                    key = ident.group(1) if ident else None
+                key_end = pos
+            elif kind == 'open':
+                stack.append(match.group())
+            elif kind == 'close':
+                if stack:
+                    stack.pop()
+            elif kind == 'slash' and _starts_regex(text, match.start()):
+                literal = _REGEX_LITERAL_RE.match(text, pos)
+                if literal:
+                    pos = literal.end()
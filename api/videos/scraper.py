@@ -0,0 +1,230 @@
+"""
+Async metadata scraping pipeline used by URLMetadataScraperView.
+
+All scrapes in a worker share one pooled `httpx.AsyncClient` per event
+loop, so connections to popular origins are kept alive between requests.
+A scrape has an overall deadline. The page itself must load within it,
+but the follow-up embed pages are fetched concurrently (capped per host)
+and whatever has been found when the budget runs out is returned, with
+`partial` set, instead of failing the whole request.
+
+Bodies are streamed through `videos.extractor.PageExtractor` as they
+arrive, so a page is parsed once, downloading stops at `</html>`, and no
+more than `MAX_BODY_BYTES` are ever read.
+"""
+import asyncio
+import time
+import weakref
+from urllib.parse import urlsplit
+
+import httpx
+from django.conf import settings
+
+from .extractor import PageExtractor
+from .player_config import PlayerConfigScanner
+
+USER_AGENT = (
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+    '(KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+)
+FETCH_TIMEOUT = getattr(settings, 'SCRAPER_FETCH_TIMEOUT', 10)
+SCRAPE_DEADLINE = getattr(settings, 'SCRAPER_DEADLINE', 15)
+PER_HOST_CONCURRENCY = getattr(settings, 'SCRAPER_PER_HOST_CONCURRENCY', 4)
+MAX_BODY_BYTES = getattr(settings, 'SCRAPER_MAX_BODY_BYTES', 5 * 1024 * 1024)
+CHUNK_SIZE = 64 * 1024
+
+# Clients and semaphores are bound to the event loop that created them.
+_clients = weakref.WeakKeyDictionary()
+_host_limits = weakref.WeakKeyDictionary()
+
+
+class ScrapeError(Exception):
+    """Raised when the requested page itself cannot be fetched."""
+
+
+def get_client():
+    """Returns the shared keep-alive client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            headers={'User-Agent': USER_AGENT},
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30),
+        )
+        _clients[loop] = client
+    return client
+
+
+def _host_limit(url):
+    limits = _host_limits.setdefault(asyncio.get_running_loop(), {})
+    host = urlsplit(url).netloc.lower()
+    if host not in limits:
+        limits[host] = asyncio.Semaphore(PER_HOST_CONCURRENCY)
+    return limits[host]
+
+
+async def _stream_into(url, extractor, timeout, referer):
+    """Streams the body of `url` into `extractor`; returns True if it was cut short."""
+    headers = {'Referer': referer or url}
+    received = 0
+    async with get_client().stream('GET', url, headers=headers, timeout=timeout) as response:
+        response.raise_for_status()
+        async for chunk in response.aiter_bytes(CHUNK_SIZE):
+            received += len(chunk)
+            if received > MAX_BODY_BYTES:
+                chunk = chunk[:len(chunk) - (received - MAX_BODY_BYTES)]
+            # Parsing is CPU-bound; keep it off the event loop.
+            await asyncio.to_thread(extractor.feed_bytes, chunk)
+            if received > MAX_BODY_BYTES:
+                return True
+            if extractor.finished:
+                break
+    return False
+
+
+async def fetch(url, deadline, extractor, referer=None):
+    """
+    Streams `url` into `extractor` within both the per-request timeout and
+    the scrape deadline. Returns True if the body exceeded MAX_BODY_BYTES
+    and only its head was extracted.
+    """
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise httpx.TimeoutException('Scrape deadline exceeded')
+    async with _host_limit(url):
+        try:
+            truncated = await asyncio.wait_for(
+                _stream_into(url, extractor, min(FETCH_TIMEOUT, remaining), referer), remaining
+            )
+        except asyncio.TimeoutError:
+            raise httpx.TimeoutException('Scrape deadline exceeded')
+    await asyncio.to_thread(extractor.finish)
+    return truncated
+
+
+def page_extractor():
+    """
+    Returns an extractor that scans each script for player configuration;
+    the media URLs found are in its `script_urls` set.
+    """
+    scanner = PlayerConfigScanner()
+    extractor = PageExtractor(script_handler=scanner.scan)
+    extractor.scanner = scanner
+    extractor.script_urls = scanner.found_urls
+    return extractor
+
+
+def page_result(extractor, url):
+    """Builds the og: metadata and candidate embed URLs of a main page."""
+    # --- Embed URL Extraction (Multi-strategy) ---
+    found_urls = set()
+
+    # Strategy 1: Look for Open Graph video tags
+    og_video = extractor.meta_content('og:video:url', 'og:video')
+    if og_video:
+        found_urls.add(og_video)
+
+    # Strategy 2: Site-specific heuristics (YouTube, etc.)
+    if 'youtube.com/watch?v=' in url:
+        try:
+            video_id = url.split('v=')[1].split('&')[0]
+            found_urls.add(f'https://www.youtube.com/embed/{video_id}')
+        except IndexError: pass
+    elif 'vimeo.com/' in url:
+        try:
+            video_id = url.split('/')[-1]
+            found_urls.add(f'https://player.vimeo.com/video/{video_id}')
+        except (IndexError, ValueError): pass
+
+    # Strategy 3: Likely iframes, and Strategy 4: HTML5 video/source tags
+    found_urls.update(extractor.iframe_srcs)
+    found_urls.update(extractor.video_srcs)
+
+    # Strategy 5: Player configuration in script tags, see videos.player_config
+    found_urls |= extractor.script_urls
+
+    metadata = {
+        'title': extractor.meta_content('og:title'),
+        'description': extractor.meta_content('og:description'),
+        'thumbnail_url': extractor.meta_content('og:image'),
+    }
+    return metadata, found_urls
+
+
+def extract_page(content, url):
+    """Extracts og: metadata and candidate embed URLs from a complete main page body."""
+    extractor = page_extractor()
+    extractor.feed_bytes(content)
+    extractor.finish()
+    return page_result(extractor, url)
+
+
+def extract_embed_page(content):
+    """Extracts media URLs from a complete embed page body."""
+    extractor = page_extractor()
+    extractor.feed_bytes(content)
+    extractor.finish()
+    return extractor.script_urls
+
+
+async def _scrape_embed_page(url, deadline, referer):
+    extractor = page_extractor()
+    await fetch(url, deadline, extractor, referer=referer)
+    return extractor.script_urls
+
+
+def best_embed_url(url_options):
+    """Makes a best guess for the default embed_url, prioritizing .m3u8."""
+    if not url_options:
+        return ''
+    m3u8_urls = [u for u in url_options if '.m3u8' in u]
+    if m3u8_urls:
+        return m3u8_urls[0]
+    # Avoid selecting an embed page as the best guess if we found media files
+    media_urls = [u for u in url_options if '.mp4' in u or '.webm' in u]
+    if media_urls:
+        return media_urls[0]
+    return url_options[0]
+
+
+async def scrape_metadata(url, budget=None):
+    """
+    Scrapes `url` and returns the title, description, thumbnail_url,
+    embed_url, embed_url_options and partial fields of the metadata payload.
+    Raises ScrapeError if the page cannot be fetched within the budget.
+    """
+    deadline = time.monotonic() + (budget or SCRAPE_DEADLINE)
+    extractor = page_extractor()
+    try:
+        truncated = await fetch(url, deadline, extractor)
+    except httpx.HTTPError as e:
+        raise ScrapeError(str(e) or e.__class__.__name__) from e
+    metadata, found_urls = page_result(extractor, url)
+    truncated = truncated or extractor.scanner.exhausted
+
+    # --- Recursive Scrape for Embed URLs ---
+    # If the only good URLs we found are embed pages, scrape them too.
+    partial = truncated
+    potential_embed_pages = [u for u in found_urls if '/embed/' in u]
+    if potential_embed_pages and not any('.m3u8' in u or '.mp4' in u for u in found_urls):
+        tasks = [
+            asyncio.create_task(_scrape_embed_page(page_url, deadline, referer=url))
+            for page_url in potential_embed_pages
+        ]
+        done, pending = await asyncio.wait(tasks, timeout=max(0, deadline - time.monotonic()))
+        for task in pending:
+            task.cancel()
+        partial = partial or bool(pending)
+        for task in done:
+            if task.exception() is None:
+                found_urls |= task.result()
+            # Ignore embed pages that fail to load
+
+    url_options = list(found_urls)
+    return {
+        **metadata,
+        'embed_url': best_embed_url(url_options),
+        'embed_url_options': url_options,
+        'partial': partial,
+    }
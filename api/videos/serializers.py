@@ -1,6 +1,11 @@
+import json
+
 from rest_framework import serializers
-from operations.models import Video, Tag
-from users.models import User, Channel, Bookmark
+from operations.models import Video, ORIENTATION_CHOICES
+from operations.tags import resolve_tags, tag_ids
+from users.models import User, Channel, Bookmark, ACCESS_CHOICES
+from .importer import FORMATS, ImportParseError, create_import_job, parse_import
+from .models import BookmarkImportJob
 
 class ManualBookmarkSerializer(serializers.Serializer):
     video = serializers.DictField()
@@ -49,19 +54,9 @@ class ManualBookmarkSerializer(serializers.Serializer):
             }
         )
 
-        # If the video was just created, set the creator.
-        # If it existed, we don't want to change the original creator.
-        if not created:
-            video.created_by = video.created_by or user
-            video.save()
-
-        # Convert tag names to Tag objects for video
-        video_tags = []
-        for tag_name in video_data['tags']:
-            tag, _ = Tag.objects.get_or_create(name=tag_name)
-            video_tags.append(tag)
-        video.tags.set(video_tags)
-        video.save()
+        # Resolve the video and bookmark tags together; see operations.tags
+        tags = resolve_tags([*video_data['tags'], *bookmark_data['tags']])
+        video.tags.set(tag_ids(video_data['tags'], tags))
 
         channel = Channel.objects.get(id=bookmark_data['channel_id'])
 
@@ -77,16 +72,69 @@ class ManualBookmarkSerializer(serializers.Serializer):
             description=bookmark_data['description'],
             access=bookmark_data['access'],
         )
-        # Convert tag names to Tag objects for bookmark
-        bookmark_tags = []
-        for tag_name in bookmark_data['tags']:
-            tag, _ = Tag.objects.get_or_create(name=tag_name)
-            bookmark_tags.append(tag)
-        bookmark.tags.set(bookmark_tags)
-        bookmark.save()
+        bookmark.tags.set(tag_ids(bookmark_data['tags'], tags))
         return bookmark
 
     def to_representation(self, instance):
         # Return the bookmark detail as response
         from users.serializers import BookmarkSerializer
         return BookmarkSerializer(instance).data
+
+class BookmarkImportSerializer(serializers.Serializer):
+    """
+    Starts a bulk import into one of the user's channels, see
+    videos.importer. The URLs come as `items` (a JSON list), as `data`
+    (the text of a JSON, CSV or bookmarks HTML file) or as an uploaded
+    `file`; `format` is detected when omitted.
+    """
+    channel_id = serializers.IntegerField()
+    access = serializers.ChoiceField(choices=ACCESS_CHOICES, default='public')
+    orientation = serializers.ChoiceField(choices=ORIENTATION_CHOICES, required=False, allow_null=True)
+    format = serializers.ChoiceField(choices=FORMATS, required=False)
+    items = serializers.ListField(required=False)
+    data = serializers.CharField(required=False, trim_whitespace=False)
+    file = serializers.FileField(required=False)
+
+    def validate_channel_id(self, value):
+        user = self.context['request'].user
+        if not Channel.objects.filter(id=value, collection__user=user).exists():
+            raise serializers.ValidationError("Channel not found.")
+        return value
+
+    def validate(self, data):
+        sources = [name for name in ('items', 'data', 'file') if name in data]
+        if len(sources) != 1:
+            raise serializers.ValidationError("Provide exactly one of items, data or file.")
+        try:
+            if 'items' in data:
+                text = json.dumps(data['items'])
+                data['items'] = parse_import(text, 'json')
+            else:
+                text = data.pop('data', None)
+                if text is None:
+                    text = data.pop('file').read().decode('utf-8-sig', errors='replace')
+                data['items'] = parse_import(text, data.get('format'))
+        except ImportParseError as e:
+            raise serializers.ValidationError({'items': str(e)})
+        return data
+
+    def create(self, validated_data):
+        return create_import_job(
+            user=self.context['request'].user,
+            channel=Channel.objects.get(id=validated_data['channel_id']),
+            items=validated_data['items'],
+            access=validated_data['access'],
+            orientation=validated_data.get('orientation'),
+        )
+
+class BookmarkImportJobSerializer(serializers.ModelSerializer):
+    items_per_second = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = BookmarkImportJob
+        fields = [
+            'id', 'status', 'channel', 'access', 'orientation', 'total', 'processed',
+            'created_count', 'skipped_count', 'failed_count', 'items_per_second', 'error',
+            'created_at', 'started_at', 'finished_at', 'results',
+        ]
+        read_only_fields = fields
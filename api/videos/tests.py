@@ -1,3 +1,267 @@
-from django.test import TestCase
+import codecs
+from datetime import timedelta
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from operations.models import Video, VideoFeedEntry
+from users.models import Bookmark, Channel, Notification
+from .cache import cache_metadata
+from .extractor import SNIFF_BYTES, PageExtractor, sniff_encoding
+from .importer import Importer, claim_stale_imports, create_import_job, run_import, run_import_job
+from .models import BookmarkImportJob
+from .player_config import PlayerConfigScanner
+from .scraper import extract_embed_page, extract_page, page_extractor, page_result
+
+PAGE = '''<!DOCTYPE html>
+<html><head>
+<meta charset="utf-8">
+<meta property="og:title" content="Caf&eacute; &amp; co">
+<meta property="og:title" content="Not the first">
+<meta property="og:description" content="Grüße">
+<meta property="og:image" content="https://img.example/t.jpg">
+<meta property="og:video" content="https://v.example/og">
+<meta property="og:video:url" content="https://v.example/og-url">
+</head><body>
+<!-- <video src="/commented.mp4"> -->
+<iframe src="https://x.example/EMBED/1"></iframe>
+<iframe src="https://x.example/ads"></iframe>
+<div><video><source src="/a.mp4"></div><source src="/outside.mp4">
+<video src="/b.mp4"><source src="/c.mp4"/></video><source src="/after.mp4">
+<script>var player = {"file": "https://cdn.example/d.m3u8"};</script>
+</body></html>
+'''
+
+
+def extract_chunked(body, url, size):
+    extractor = page_extractor()
+    for start in range(0, len(body), size):
+        extractor.feed_bytes(body[start:start + size])
+    extractor.finish()
+    return page_result(extractor, url)
+
+
+class PageExtractorTests(SimpleTestCase):
+    def test_page(self):
+        metadata, found_urls = extract_page(PAGE.encode(), 'https://www.youtube.com/watch?v=abc&t=1')
+        self.assertEqual(metadata, {
+            'title': 'Café & co',
+            'description': 'Grüße',
+            'thumbnail_url': 'https://img.example/t.jpg',
+        })
+        self.assertEqual(found_urls, {
+            'https://v.example/og-url',
+            'https://www.youtube.com/embed/abc',
+            'https://x.example/EMBED/1',
+            '/a.mp4', '/b.mp4', '/c.mp4',
+            'https://cdn.example/d.m3u8',
+        })
+
+    def test_chunk_boundaries_do_not_matter(self):
+        body = PAGE.encode()
+        expected = extract_page(body, 'https://vimeo.com/42')
+        for size in (1, 7, 64, SNIFF_BYTES + 1):
+            with self.subTest(size=size):
+                self.assertEqual(extract_chunked(body, 'https://vimeo.com/42', size), expected)
+
+    def test_end_tag_closes_everything_opened_after_its_start_tag(self):
+        # As in BeautifulSoup: </b> closes the video, so the second source is outside it
+        _, found_urls = extract_page(b'<video><b><source src="/in.mp4"></video><source src="/out.mp4"></b>', '')
+        self.assertEqual(found_urls, {'/in.mp4'})
+
+    def test_stray_end_tag_is_ignored(self):
+        _, found_urls = extract_page(b'<video></div><source src="/in.mp4"></video>', '')
+        self.assertEqual(found_urls, {'/in.mp4'})
+
+    def test_finished_after_closing_html(self):
+        extractor = PageExtractor()
+        extractor.feed_bytes(b'<html><body>' + b' ' * SNIFF_BYTES)
+        self.assertFalse(extractor.finished)
+        extractor.feed_bytes(b'</body></html>')
+        self.assertTrue(extractor.finished)
+
+    def test_script_handler_gets_each_non_empty_script(self):
+        scripts = []
+        extractor = PageExtractor(script_handler=scripts.append)
+        extractor.feed_bytes(b'<script>a = 1;</script><script src="x.js"></script><script>b = "</p>";</script>')
+        extractor.finish()
+        self.assertEqual(scripts, ['a = 1;', 'b = "</p>";'])
+
+
+class SniffEncodingTests(SimpleTestCase):
+    def title(self, body):
+        return extract_page(body, '')[0]['title']
+
+    def test_byte_order_mark_wins(self):
+        body = codecs.BOM_UTF16_LE + '<meta charset="latin-1"><meta property="og:title" content="Grüße">'.encode('utf-16-le')
+        self.assertEqual(self.title(body), 'Grüße')
+        self.assertEqual(sniff_encoding(codecs.BOM_UTF8 + b'<p>'), 'utf-8-sig')
+
+    def test_declared_charset(self):
+        body = '<meta charset="windows-1251"><meta property="og:title" content="Привет">'.encode('cp1251')
+        self.assertEqual(self.title(body), 'Привет')
+
+    def test_http_equiv_declaration(self):
+        body = (b'<meta http-equiv="Content-Type" content="text/html; charset=ISO-8859-1">'
+                b'<meta property="og:title" content="caf\xe9">')
+        self.assertEqual(self.title(body), 'café')
+
+    def test_unknown_charset_falls_back_to_utf8(self):
+        body = '<meta charset="nonsense"><meta property="og:title" content="café">'.encode()
+        self.assertEqual(self.title(body), 'café')
+
+    def test_declaration_after_sniff_bytes_is_ignored(self):
+        body = b'<p>' + b' ' * SNIFF_BYTES + b'</p><meta charset="latin-1"><meta property="og:title" content="caf\xc3\xa9">'
+        self.assertEqual(self.title(body), 'café')
+        self.assertEqual(extract_chunked(body, '', 5)[0]['title'], 'café')
+
+    def test_short_document_is_decoded_on_finish(self):
+        extractor = PageExtractor()
+        extractor.feed_bytes('<meta charset="koi8-r"><meta property="og:title" content="Привет">'.encode('koi8-r'))
+        self.assertEqual(extractor.meta, {})
+        extractor.finish()
+        self.assertEqual(extractor.meta_content('og:title'), 'Привет')
+
+
+class PlayerConfigScannerTests(SimpleTestCase):
+    def scan(self, *scripts, **limits):
+        scanner = PlayerConfigScanner(**limits)
+        for script in scripts:
+            scanner.scan(script)
+        return scanner.found_urls
+
+    def test_media_keys_at_any_depth(self):
+        script = """
+            jwplayer("p").setup({file: "https://cdn.example/a.mp4", tracks: [{src: "https://cdn.example/b.mp4"}]});
+            var cfg = {"sources": {"hls": "https://cdn.example/c.m3u8", "poster": "https://cdn.example/no.mp4"}};
+            var other = {video_url: 'https://cdn.example/d.mp4', file: "https://cdn.example/page.html"};
+        """
+        self.assertEqual(self.scan(script), {
+            'https://cdn.example/a.mp4', 'https://cdn.example/b.mp4',
+            'https://cdn.example/c.m3u8', 'https://cdn.example/d.mp4',
+        })
+
+    def test_only_object_members(self):
+        script = 'var a = ["https://cdn.example/x.mp4"]; label: "https://cdn.example/y.mp4"; f(file, "z.mp4");'
+        self.assertEqual(self.scan(script), set())
+
+    def test_escapes(self):
+        script = r"""var cfg = {"hls": "https:\/\/cdn.example\/a.m3u8", 'file': 'https://cdn.example/\u0062\x2d1.mp4'};"""
+        self.assertEqual(self.scan(script), {'https://cdn.example/a.m3u8', 'https://cdn.example/b-1.mp4'})
+
+    def test_strings_comments_and_templates_are_skipped_whole(self):
+        script = """
+            var s = "{file: \\"https://cdn.example/in-string.mp4\\"}";
+            // {file: "https://cdn.example/line-comment.mp4"}
+            /* {file: "https://cdn.example/block-comment.mp4"} */
+            var t = `{file: "https://cdn.example/in-template.mp4"}`;
+            var cfg = {src: `https://cdn.example/template.mp4`, file: `${base}/interpolated.mp4`};
+        """
+        self.assertEqual(self.scan(script), {'https://cdn.example/template.mp4'})
+
+    def test_regex_literals(self):
+        script = r"""
+            var braces = /[{}]/g, quote = /"/;
+            if (/}/.test(x)) { y = a / b / c; }
+            return /{file: "https:\/\/cdn.example\/in-regex.mp4"}/.test(s) || {file: "https://cdn.example/real.mp4"};
+        """
+        self.assertEqual(self.scan(script), {'https://cdn.example/real.mp4'})
+
+    def test_division_is_not_a_regex(self):
+        script = 'var r = total / 2, cfg = {file: "https://cdn.example/a.mp4"}, q = n / 3;'
+        self.assertEqual(self.scan(script), {'https://cdn.example/a.mp4'})
+
+    def test_character_budget(self):
+        first = 'var a = {file: "https://cdn.example/a.mp4"};'
+        second = 'var b = {file: "https://cdn.example/b.mp4"};'
+        scanner = PlayerConfigScanner(max_chars=len(first) + 5)
+        scanner.scan(first)
+        self.assertFalse(scanner.exhausted)
+        scanner.scan(second)
+        self.assertTrue(scanner.exhausted)
+        self.assertEqual(scanner.found_urls, {'https://cdn.example/a.mp4'})
+        scanner.scan('var c = {file: "https://cdn.example/c.mp4"};')
+        self.assertEqual(scanner.found_urls, {'https://cdn.example/a.mp4'})
+
+    def test_time_budget(self):
+        scanner = PlayerConfigScanner(max_seconds=0)
+        scanner.scan('{}' * 10000 + 'var a = {file: "https://cdn.example/a.mp4"};')
+        self.assertTrue(scanner.exhausted)
+        self.assertEqual(scanner.found_urls, set())
+
+    def test_shared_by_page_and_embed_extraction(self):
+        body = b'<script>var cfg = {sources: [{file: "https://cdn.example/a.m3u8"}]};</script>'
+        self.assertIn('https://cdn.example/a.m3u8', extract_page(body, '')[1])
+        self.assertEqual(extract_embed_page(body), {'https://cdn.example/a.m3u8'})
+
+
+class ImporterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('importer', 'importer@example.com', 'password')
+        cls.channel = Channel.objects.get(collection__user=cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def item(self, url, title='', tags=('tag',)):
+        # Seeds the scrape cache so nothing is fetched
+        cache_metadata(url, {'title': f'Scraped {url}', 'description': 'From the page'})
+        return {'url': url, 'title': title, 'description': '', 'tags': list(tags)}
+
+    def test_each_item_gets_a_result(self):
+        existing = Video.objects.create(source_url='https://example.com/known', title='Known')
+        Bookmark.objects.create(user=self.user, channel=self.channel, video=existing, title='', access='public')
+        other = Video.objects.create(source_url='https://example.com/other', title='Other')
+        items = [
+            self.item('https://example.com/new', title='Mine', tags=['Funny Cats']),
+            self.item('https://example.com/new'),
+            {'url': 'ftp://example.com/file', 'title': '', 'description': '', 'tags': []},
+            {'url': 'https://example.com/long-tag', 'title': '', 'description': '', 'tags': ['x' * 51]},
+            self.item('https://example.com/known'),
+            self.item('https://example.com/other'),
+        ]
+        job = run_import(create_import_job(self.user, self.channel, items), chunk_size=2)
+
+        self.assertEqual(
+            [result['status'] for result in job.results],
+            ['created', 'duplicate', 'failed', 'failed', 'exists', 'bookmarked'],
+        )
+        self.assertEqual((job.status, job.processed, job.created_count, job.skipped_count, job.failed_count),
+                         ('done', 6, 2, 2, 2))
+        bookmark = Bookmark.objects.get(pk=job.results[0]['bookmark_id'])
+        self.assertEqual((bookmark.title, bookmark.description), ('Mine', 'From the page'))
+        self.assertEqual(list(bookmark.tags.values_list('name', flat=True)), ['funnycats'])
+        self.assertEqual(bookmark.video.title, 'Mine')
+        self.assertEqual(job.results[5]['video_id'], other.pk)
+        # Signals do not fire for bulk writes; the importer refreshes what they would
+        self.assertTrue(VideoFeedEntry.objects.filter(video_id=bookmark.video_id, bookmark=bookmark).exists())
+        self.assertEqual(Video.objects.get(pk=other.pk).bookmarks_count, 1)
+        # Imports do not notify anyone
+        self.assertFalse(Notification.objects.exists())
+
+    def test_stale_jobs_resume_after_their_saved_results(self):
+        items = [self.item(f'https://example.com/{i}') for i in range(3)]
+        job = create_import_job(self.user, self.channel, items)
+        # A worker wrote the first chunk, then died
+        importer = Importer(job)
+        importer.import_chunk([0])
+        importer.save_progress()
+        written = job.results[0]
+        an_hour_ago = timezone.now() - timedelta(hours=1)
+        BookmarkImportJob.objects.filter(pk=job.pk).update(status='running', updated_at=an_hour_ago)
+        fresh = create_import_job(self.user, self.channel, [self.item('https://example.com/fresh')])
+
+        self.assertEqual(claim_stale_imports(stale_after=60), [job.pk])
+        self.assertEqual(claim_stale_imports(stale_after=60), [])
+        run_import_job(job.pk)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed, job.created_count), ('done', 3, 3))
+        self.assertEqual(job.results[0], written)
+        self.assertEqual([result['status'] for result in job.results], ['created'] * 3)
+        self.assertEqual(Bookmark.objects.filter(user=self.user).count(), 3)
+        fresh.refresh_from_db()
+        self.assertEqual(fresh.status, 'pending')